@@ -9,6 +9,15 @@ float prev_gx = 0, prev_gy = 0, prev_gz = 0;
 float prev_ax = 0, prev_ay = 0, prev_az = 0;
 const float filter_alpha = 0.8; // 滤波系数
 
+// 原始数据模式：跳过板上的低通滤波和陀螺仪缩放，由上位机滤波
+// 上位机发送 'R' 切换到原始模式，发送 'F' 恢复板上滤波
+bool raw_output = false;
+
+// 时间戳模式：在每行末尾附加 millis()，用于上位机测量延迟
+// 上位机发送 'T' 开启，发送 't' 关闭；上次会话开启后设备没有复位时仍然有效，
+// 上位机每次连接都应发送自己需要的模式
+bool timestamp_output = false;
+
 void setup() {
   Serial.begin(115200);
   delay(2000); // 增加延迟，确保串口稳定
@@ -40,9 +49,31 @@ void setup() {
   initialized = true;
 }
 
+// 处理上位机发来的模式切换命令
+void handleCommands() {
+  while (Serial.available()) {
+    char cmd = Serial.read();
+    if (cmd == 'R') {
+      raw_output = true;
+      Serial.println("MODE_RAW");
+    } else if (cmd == 'F') {
+      raw_output = false;
+      Serial.println("MODE_FILTERED");
+    } else if (cmd == 'T') {
+      timestamp_output = true;
+      Serial.println("MODE_TIMESTAMP");
+    } else if (cmd == 't') {
+      timestamp_output = false;
+      Serial.println("MODE_NO_TIMESTAMP");
+    }
+  }
+}
+
 void loop() {
   if (!initialized) return;
   
+  handleCommands();
+  
   int16_t accelGyro[6] = {0};
   int rslt = bmi160.getAccelGyroData(accelGyro);
   
@@ -57,25 +88,27 @@ void loop() {
     float gy = accelGyro[1];
     float gz = accelGyro[2];
     
-    // 简单低通滤波，减少噪声
-    ax = filter_alpha * ax + (1-filter_alpha) * prev_ax;
-    ay = filter_alpha * ay + (1-filter_alpha) * prev_ay;
-    az = filter_alpha * az + (1-filter_alpha) * prev_az;
-    
-    gx = filter_alpha * gx + (1-filter_alpha) * prev_gx;
-    gy = filter_alpha * gy + (1-filter_alpha) * prev_gy;
-    gz = filter_alpha * gz + (1-filter_alpha) * prev_gz;
-    
-    // 保存当前值为下次滤波做准备
-    prev_ax = ax; prev_ay = ay; prev_az = az;
-    prev_gx = gx; prev_gy = gy; prev_gz = gz;
-    
-    // 在陀螺仪数据上应用一个缩放因子，使旋转更接近1:1
-    gx *= 0.75;
-    gy *= 0.75;
-    gz *= 0.75;
+    if (!raw_output) {
+      // 简单低通滤波，减少噪声
+      ax = filter_alpha * ax + (1-filter_alpha) * prev_ax;
+      ay = filter_alpha * ay + (1-filter_alpha) * prev_ay;
+      az = filter_alpha * az + (1-filter_alpha) * prev_az;
+      
+      gx = filter_alpha * gx + (1-filter_alpha) * prev_gx;
+      gy = filter_alpha * gy + (1-filter_alpha) * prev_gy;
+      gz = filter_alpha * gz + (1-filter_alpha) * prev_gz;
+      
+      // 保存当前值为下次滤波做准备
+      prev_ax = ax; prev_ay = ay; prev_az = az;
+      prev_gx = gx; prev_gy = gy; prev_gz = gz;
+      
+      // 在陀螺仪数据上应用一个缩放因子，使旋转更接近1:1
+      gx *= 0.75;
+      gy *= 0.75;
+      gz *= 0.75;
+    }
 
-    // 输出格式：ax,ay,az,gx,gy,gz
+    // 输出格式：ax,ay,az,gx,gy,gz[,millis]
     Serial.print(ax, 4);
     Serial.print(",");
     Serial.print(ay, 4);
@@ -86,7 +119,13 @@ void loop() {
     Serial.print(",");
     Serial.print(gy, 4);
     Serial.print(",");
-    Serial.println(gz, 4); // 修改为println，移除多余的逗号
+    if (timestamp_output) {
+      Serial.print(gz, 4);
+      Serial.print(",");
+      Serial.println(millis());
+    } else {
+      Serial.println(gz, 4); // 修改为println，移除多余的逗号
+    }
   } else {
     Serial.println("读取数据失败，错误代码：" + String(rslt));
     delay(1000);  // 错误时延长等待时间
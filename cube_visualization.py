@@ -4,8 +4,25 @@ from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import serial
-import math
 import time
+import argparse
+from signal_filters import FilterBank
+from fusion import ComplementaryFilter, process_block, DEVICE_RAW, FILTER_CONFIG
+from latency import LatencyTracker, SerialReader, feed_arrivals
+from stream_parser import ChunkParser, print_malformed
+from trajectory_store import TrajectoryWriter, new_recording_path
+from events import EventEngine, EventLog, UdpPublisher, print_event
+
+# 默认串口
+SERIAL_PORT = 'COM3'
+# 姿态记录目录
+RECORD_DIR = 'recordings'
+
+# 滤波和姿态融合的配置（DEVICE_RAW、FILTER_CONFIG、GYRO_GAIN 等）在 fusion.py 中，与其他程序共用
+# 事件检测（敲击/摇晃/翻转/自由落体）的检测器配置，None 使用 events.py 中的默认配置
+EVENT_DETECTORS = None
+# 事件同时以JSON数据报发送到本机的这个UDP端口，None 为不发送
+EVENT_UDP_PORT = 9160
 
 # 立方体顶点
 vertices = (
@@ -82,7 +99,7 @@ def draw_cube():
     glEnd()
     glLineWidth(1.0)
 
-def main():
+def main(port=SERIAL_PORT, latency=False, fake_device=False):
     pygame.init()
     display = (800, 600)
     pygame.display.set_mode(display, DOUBLEBUF|OPENGL)
@@ -102,9 +119,17 @@ def main():
     
     print("OpenGL初始化完成")
     
+    # 没有硬件时使用pty虚拟设备
+    device = None
+    if fake_device:
+        from fake_device import FakeDevice
+        device = FakeDevice().start()
+        port = device.port
+        print(f"使用虚拟设备: {port}")
+
     # 设置串口通信
     try:
-        ser = serial.Serial('COM3', 115200, timeout=1)
+        ser = serial.Serial(port, 115200, timeout=1)
         print("串口连接成功")
     except Exception as e:
         print(f"串口连接失败: {str(e)}")
@@ -126,50 +151,86 @@ def main():
         pygame.event.pump()  # 保持窗口响应
         time.sleep(0.1)
 
-    # 欧拉角
-    roll = pitch = yaw = 0.0
+    # 请求原始数据或板上滤波并建立上位机滤波链；每次都明确发送，
+    # 上一次会话切换的模式在设备没有复位时仍然有效
+    ser.write(b'R' if DEVICE_RAW else b'F')
+    filter_bank = FilterBank(FILTER_CONFIG)
+    print(f"滤波配置: {FILTER_CONFIG}")
+    print(filter_bank.describe())
+
+    # 延迟测量模式：请求固件附加设备时间戳；否则明确关闭，
+    # 上一次延迟测量后设备没有复位时仍会发送时间戳
+    tracker = None
+    ser.write(b'T' if latency else b't')
+    if latency:
+        # 虚拟设备与主机共用单调时钟，真实设备的时钟偏差用最小传输时间估计
+        tracker = LatencyTracker(0.0 if device else None)
+
+    # 串口数据块解析器，非数据行（如固件的错误信息）交给诊断输出
+    parser = ChunkParser(fields=7 if latency else 6, on_malformed=print_malformed)
+
+    # 互补滤波姿态解算
+    attitude = ComplementaryFilter()
+
+    # 姿态角写入压缩轨迹文件，可用 trajectory_store.py 查看
+    record_path = new_recording_path(RECORD_DIR, 'attitude')
+    recorder = TrajectoryWriter(record_path, ['roll', 'pitch', 'yaw'])
+    last_sample_time = time.time()
+    print(f"姿态记录到: {record_path}")
+
+    # 融合之后的事件检测，事件打印到控制台、写入事件日志并发送到本机UDP端口
+    event_log = EventLog(new_recording_path(RECORD_DIR, 'events', '.jsonl'))
+    event_outputs = [print_event, event_log]
+    publisher = None
+    if EVENT_UDP_PORT:
+        publisher = UdpPublisher(port=EVENT_UDP_PORT)
+        event_outputs.append(publisher)
+    event_engine = EventEngine(EVENT_DETECTORS, outputs=event_outputs)
+    print(f"事件记录到: {event_log.path}")
+    
+    # 读线程阻塞在串口上，记录每块数据的到达时间
+    reader = SerialReader(ser).start()
     
     while True:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
+                reader.stop()
                 ser.close()
+                recorder.close()
+                event_log.close()
+                if publisher:
+                    publisher.close()
+                if device:
+                    device.stop()
+                if tracker:
+                    print(tracker.report())
                 return
 
-        # 读取串口数据
-        if ser.in_waiting:
-            try:
-                line = ser.readline().decode('utf-8', errors='ignore').strip()
-                
-                # 忽略非数据行
-                if ',' not in line:
-                    continue
-                    
-                data = [float(x) for x in line.split(',')]
-                if len(data) == 6:
-                    ax, ay, az, gx, gy, gz = data
-                    print(f"接收数据: ax={ax:.2f}, ay={ay:.2f}, az={az:.2f}, gx={gx:.2f}, gy={gy:.2f}, gz={gz:.2f}")
-                    
-                    # 简单的互补滤波
-                    dt = 0.01
-                    # 降低角速度的增益，使旋转更接近实际
-                    roll += gx * dt * 0.5  # 降低系数到0.5
-                    pitch += gy * dt * 0.5
-                    yaw += gz * dt * 0.5
-                    
-                    # 使用加速度计数据修正roll和pitch
-                    roll_acc = math.atan2(ay, az) * 180/math.pi
-                    pitch_acc = math.atan2(-ax, math.sqrt(ay*ay + az*az)) * 180/math.pi
-                    
-                    # 互补滤波系数，增加加速度计的权重
-                    alpha = 0.8  # 降低从0.96到0.8，增加加速度计的影响
-                    roll = alpha * roll + (1-alpha) * roll_acc
-                    pitch = alpha * pitch + (1-alpha) * pitch_acc
-                    
-                    print(f"姿态角: roll={roll:.2f}, pitch={pitch:.2f}, yaw={yaw:.2f}")
-            except Exception as e:
-                print(f"数据处理错误: {str(e)}")
-                continue
+        # 取出读线程收到的所有数据并整块解析，rx_time 为最新样本的到达时间
+        rows, rx_time = feed_arrivals(parser, reader.drain())
+        if len(rows):
+            fusion_start = time.monotonic()
+            # 滤波和互补滤波姿态融合
+            samples, poses, _ = process_block(rows[:, :6], filter_bank, attitude)
+            if tracker:
+                # 延迟测量模式下第7列为设备时间戳（毫秒），记录本块中最新的样本
+                tracker.on_fused(rows[-1, 6], rx_time, fusion_start, time.monotonic())
+            roll, pitch, yaw = poses[-1]
+            ax, ay, az, gx, gy, gz = samples[-1]
+            # 本块样本均匀分布在上一块与当前时间之间，保证时间单调递增
+            now = time.time()
+            sample_times = np.linspace(last_sample_time, now, len(poses) + 1)[1:]
+            recorder.extend(sample_times, poses)
+            last_sample_time = now
+            event_engine.process(sample_times, samples, poses)
+            if tracker:
+                # 轨迹记录和事件检测单独计为“记录/事件”阶段
+                tracker.on_handled(time.monotonic())
+            
+            # 每块只打印最新的样本，逐行打印会拖慢主循环
+            print(f"接收数据: ax={ax:.2f}, ay={ay:.2f}, az={az:.2f}, gx={gx:.2f}, gy={gy:.2f}, gz={gz:.2f}")
+            print(f"姿态角: roll={roll:.2f}, pitch={pitch:.2f}, yaw={yaw:.2f}")
 
         # 清除缓冲区并设置背景色
         glClearColor(0.2, 0.2, 0.2, 1)
@@ -183,16 +244,24 @@ def main():
         draw_axes()
         
         # 应用旋转
-        glRotatef(roll, 1, 0, 0)
-        glRotatef(pitch, 0, 1, 0)
-        glRotatef(yaw, 0, 0, 1)
+        glRotatef(attitude.roll, 1, 0, 0)
+        glRotatef(attitude.pitch, 0, 1, 0)
+        glRotatef(attitude.yaw, 0, 0, 1)
         
         # 绘制立方体
         draw_cube()
         
         # 刷新显示
+        flip_start = time.monotonic()
         pygame.display.flip()
+        if tracker:
+            tracker.on_frame(flip_start, time.monotonic())
         pygame.time.wait(10)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='BMI160 姿态可视化')
+    parser.add_argument('--port', default=SERIAL_PORT, help='串口名称')
+    parser.add_argument('--latency', action='store_true', help='测量动作到显示的延迟，退出时打印统计')
+    parser.add_argument('--fake-device', action='store_true', help='使用pty虚拟设备代替ESP32')
+    args = parser.parse_args()
+    main(args.port, args.latency, args.fake_device) 
\ No newline at end of file
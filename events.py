@@ -0,0 +1,341 @@
+import math
+import json
+import time
+import socket
+import argparse
+from signal_filters import DEFAULT_FS
+
+# 流式手势/事件检测：接在姿态融合之后，每个样本以 O(1) 更新窗口特征，
+# 再由可配置的检测器判断是否发出事件（敲击、摇晃、翻转、自由落体）。
+# 加速度单位为 g，角度单位为度；每个传感器有独立的特征和检测器状态。
+
+# 默认检测器配置，可以按类型增删或修改阈值，同一类型可以配置多个（用 name 区分）
+DEFAULT_DETECTORS = [
+    # 加加速度（jerk）突然超过阈值且之前的窗口能量很低（静止），confirm 秒后 jerk 已回落、
+    # 加速度回到敲击前 quiet 以内（不是摇晃或下落的开始）才确认；敲击本身的尖峰不参与判断
+    {'type': 'tap', 'jerk': 30.0, 'release': 10.0, 'quiet': 0.25, 'confirm': 0.1, 'refractory': 0.2},
+    # 窗口内加速度向量的标准差（运动能量）和 jerk 均方根同时超过阈值，
+    # 后者用来排除翻转这类缓慢的大幅度姿态变化；两者都降到阈值的 release 倍以下才复位
+    {'type': 'shake', 'energy': 0.6, 'jerk': 15.0, 'release': 0.5},
+    # 重力方向（低通后的z分量）在朝上/朝下之间切换
+    {'type': 'flip', 'threshold': 0.6},
+    # 加速度模长持续低于阈值
+    {'type': 'freefall', 'threshold': 0.3, 'release': 0.6, 'duration': 0.08},
+]
+
+
+# 检测器的 update(t, features) 返回 None，或 (事件时间, 事件值)
+
+
+class Hysteresis:
+    # 带回差的阈值：on > off 时数值升到 on 以上触发、降到 off 以下复位；
+    # on < off 时方向相反（用于“低于阈值”的判断）。update 只在触发的那一刻返回 True
+    def __init__(self, on, off):
+        self.on = on
+        self.off = off
+        self.active = False
+
+    def update(self, value):
+        rising = self.on >= self.off
+        if self.active:
+            if (value <= self.off) if rising else (value >= self.off):
+                self.active = False
+            return False
+        if (value >= self.on) if rising else (value <= self.on):
+            self.active = True
+            return True
+        return False
+
+
+class RunningMean:
+    # 固定长度窗口的滑动平均，环形缓冲 + 累加和，每次更新 O(1)
+    def __init__(self, size):
+        self.buffer = [0.0] * max(int(size), 1)
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+
+    def update(self, value):
+        self.total += value - self.buffer[self.index]
+        self.buffer[self.index] = value
+        self.index = (self.index + 1) % len(self.buffer)
+        self.count = min(self.count + 1, len(self.buffer))
+        # 累加和的舍入误差可能让它略小于0
+        return max(self.total, 0.0) / self.count
+
+
+class StreamFeatures:
+    # 单个传感器的增量特征，检测器之间共享
+    def __init__(self, fs=DEFAULT_FS, window=0.5, gravity_time=0.1):
+        self.fs = fs
+        # 加速度各轴及其平方和的窗口均值，用于计算窗口内的方差
+        self.accel_windows = [RunningMean(window * fs) for _ in range(3)]
+        self.square_window = RunningMean(window * fs)
+        self.jerk_window = RunningMean(window * fs)
+        self.rotation_window = RunningMean(window * fs)
+        self.window_size = len(self.rotation_window.buffer)
+        # 重力方向低通的系数
+        self.gravity_alpha = min(1.0 / (gravity_time * fs), 1.0)
+        self.prev = None
+        self.magnitude = 1.0
+        self.jerk = 0.0
+        self.jerk_energy = 0.0
+        self.energy = 0.0
+        self.rotation = 0.0
+        self.gravity_z = None
+
+    def update(self, ax, ay, az, roll, pitch):
+        self.magnitude = math.sqrt(ax*ax + ay*ay + az*az)
+        if self.prev is None:
+            self.prev = (ax, ay, az, roll, pitch)
+            self.gravity_z = az / self.magnitude if self.magnitude > 0 else 0.0
+        px, py, pz, proll, ppitch = self.prev
+        self.prev = (ax, ay, az, roll, pitch)
+
+        # 加加速度：相邻样本加速度向量之差（g/s）
+        self.jerk = math.sqrt((ax-px)**2 + (ay-py)**2 + (az-pz)**2) * self.fs
+        self.jerk_energy = math.sqrt(self.jerk_window.update(self.jerk * self.jerk))
+        # 运动能量：窗口内加速度向量的标准差，与朝向无关，静止时接近0
+        mx, my, mz = (w.update(v) for w, v in zip(self.accel_windows, (ax, ay, az)))
+        variance = self.square_window.update(ax*ax + ay*ay + az*az) - (mx*mx + my*my + mz*mz)
+        self.energy = math.sqrt(max(variance, 0.0))
+        # 窗口内姿态变化的角度之和，角度差按±180度折回
+        change = abs((roll - proll + 180.0) % 360.0 - 180.0) + abs((pitch - ppitch + 180.0) % 360.0 - 180.0)
+        self.rotation = self.rotation_window.update(change) * self.window_size
+        # 重力方向：归一化z分量的低通，自由落体时模长接近0，不更新
+        if self.magnitude > 0.5:
+            self.gravity_z += self.gravity_alpha * (az / self.magnitude - self.gravity_z)
+
+
+class TapDetector:
+    def __init__(self, name, jerk, release, quiet, confirm, refractory):
+        self.name = name
+        self.threshold = Hysteresis(jerk, release)
+        self.quiet = quiet
+        self.confirm = confirm
+        self.refractory = refractory
+        self.last_time = -math.inf
+        # 上一个样本的加速度和窗口能量，jerk 突变时作为敲击之前的状态
+        # （当前样本的窗口能量已经包含了尖峰，越用力的敲击越不“安静”）
+        self.before = None
+        # 等待确认的敲击：(时间, jerk, 敲击前的加速度)
+        self.pending = None
+
+    def update(self, t, features):
+        accel = features.prev[:3]
+        before, self.before = self.before, (accel, features.energy)
+        if self.threshold.update(features.jerk) and self.pending is None and before is not None:
+            if t - self.last_time >= self.refractory and before[1] < self.quiet:
+                self.pending = (t, features.jerk, before[0])
+        if self.pending is None or t - self.pending[0] < self.confirm:
+            return None
+        # 事件时间戳仍为敲击发生的时刻
+        tap_time, jerk, rest = self.pending
+        self.pending = None
+        if self.threshold.active or math.dist(accel, rest) >= self.quiet:
+            return None
+        self.last_time = tap_time
+        return tap_time, jerk
+
+
+class ShakeDetector:
+    def __init__(self, name, energy, jerk, release):
+        self.name = name
+        self.energy = energy
+        self.jerk = jerk
+        # 两个特征按各自阈值归一化后取较小者，大于等于1表示都超过了阈值
+        self.threshold = Hysteresis(1.0, release)
+
+    def update(self, t, features):
+        score = min(features.energy / self.energy, features.jerk_energy / self.jerk)
+        return (t, features.energy) if self.threshold.update(score) else None
+
+
+class FlipDetector:
+    def __init__(self, name, threshold):
+        self.name = name
+        self.up = Hysteresis(threshold, -threshold)
+        self.down = Hysteresis(-threshold, threshold)
+        self.state = None
+
+    def update(self, t, features):
+        # 朝上/朝下各自带回差，第一次确定朝向时不算翻转
+        state = self.state
+        if self.up.update(features.gravity_z):
+            state = 'up'
+        elif self.down.update(features.gravity_z):
+            state = 'down'
+        if state == self.state:
+            return None
+        previous, self.state = self.state, state
+        if previous is None:
+            return None
+        return t, {'to': state, 'rotation': features.rotation}
+
+
+class FreefallDetector:
+    def __init__(self, name, threshold, release, duration, fs):
+        self.name = name
+        self.threshold = Hysteresis(threshold, release)
+        self.fs = fs
+        self.samples = max(int(round(duration * fs)), 1)
+        self.count = 0
+        self.reported = False
+
+    def update(self, t, features):
+        self.threshold.update(features.magnitude)
+        if not self.threshold.active:
+            self.count = 0
+            self.reported = False
+            return None
+        self.count += 1
+        # 持续足够长的时间才报告，每次下落只报告一次
+        if self.count >= self.samples and not self.reported:
+            self.reported = True
+            # 事件值为已经持续的下落时间（秒）
+            return t, self.count / self.fs
+        return None
+
+
+def make_detector(spec, fs=DEFAULT_FS):
+    spec = dict(spec)
+    kind = spec.pop('type')
+    name = spec.pop('name', kind)
+    if kind == 'tap':
+        return TapDetector(name, spec.get('jerk', 30.0), spec.get('release', 10.0), spec.get('quiet', 0.25),
+                           spec.get('confirm', 0.1), spec.get('refractory', 0.2))
+    if kind == 'shake':
+        return ShakeDetector(name, spec.get('energy', 0.6), spec.get('jerk', 15.0), spec.get('release', 0.5))
+    if kind == 'flip':
+        return FlipDetector(name, spec.get('threshold', 0.6))
+    if kind == 'freefall':
+        return FreefallDetector(name, spec.get('threshold', 0.3), spec.get('release', 0.6),
+                                spec.get('duration', 0.08), fs)
+    raise ValueError(f"未知的检测器类型: {kind}")
+
+
+class SensorEvents:
+    # 单个传感器的特征和检测器
+    def __init__(self, detectors, fs):
+        self.features = StreamFeatures(fs)
+        self.detectors = [make_detector(spec, fs) for spec in detectors]
+
+
+class EventEngine:
+    # 按传感器编号分别维护状态，检测到的事件按顺序交给所有输出（回调）
+    # 事件为字典：time（样本时间戳）、sensor、type（检测器名称）、value
+    def __init__(self, detectors=None, fs=DEFAULT_FS, outputs=()):
+        self.detector_specs = list(DEFAULT_DETECTORS if detectors is None else detectors)
+        self.fs = fs
+        self.outputs = list(outputs)
+        self.sensors = {}
+        self.counts = {}
+
+    def subscribe(self, callback):
+        self.outputs.append(callback)
+        return callback
+
+    def reset(self, sensor=None):
+        if sensor is None:
+            self.sensors.clear()
+        else:
+            self.sensors.pop(sensor, None)
+
+    def process(self, times, samples, poses, sensor=0):
+        # times: 每个样本的时间戳；samples: (N, 6) 滤波后的数据；poses: 融合得到的 (roll, pitch, yaw)
+        state = self.sensors.get(sensor)
+        if state is None:
+            state = self.sensors[sensor] = SensorEvents(self.detector_specs, self.fs)
+        features = state.features
+        detectors = state.detectors
+        events = []
+        for t, sample, pose in zip(times, samples, poses):
+            features.update(float(sample[0]), float(sample[1]), float(sample[2]), float(pose[0]), float(pose[1]))
+            for detector in detectors:
+                result = detector.update(t, features)
+                if result is not None:
+                    events.append({'time': float(result[0]), 'sensor': sensor, 'type': detector.name, 'value': result[1]})
+        for event in events:
+            self.counts[event['type']] = self.counts.get(event['type'], 0) + 1
+            for output in self.outputs:
+                output(event)
+        return events
+
+
+def format_event(event):
+    value = event['value']
+    if isinstance(value, dict):
+        value = ' '.join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in value.items())
+    elif isinstance(value, float):
+        value = f"{value:.2f}"
+    clock = time.strftime('%H:%M:%S', time.localtime(event['time']))
+    return f"[{clock}] 传感器{event['sensor']} {event['type']}: {value}"
+
+
+def print_event(event):
+    # 默认的控制台输出
+    print(f"事件 {format_event(event)}")
+
+
+class EventLog:
+    # 事件按行写入JSON文件
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def __call__(self, event):
+        self.file.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class UdpPublisher:
+    # 把事件以JSON数据报发送到本机端口，其他程序监听该端口即可触发动作；没有接收方时直接丢弃
+    def __init__(self, host='127.0.0.1', port=9160):
+        self.address = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def __call__(self, event):
+        try:
+            self.sock.sendto(json.dumps(event, ensure_ascii=False).encode('utf-8'), self.address)
+        except OSError:
+            pass
+
+    def close(self):
+        self.sock.close()
+
+
+if __name__ == "__main__":
+    # 对录制的串口数据（或内置的模拟数据）运行检测，打印事件和每个样本的处理时间
+    import numpy as np
+    from stream_parser import ChunkParser
+    from signal_filters import FilterBank
+    from fusion import ComplementaryFilter, process_block, FILTER_CONFIG
+    from golden_replay import load_stream
+
+    parser = argparse.ArgumentParser(description='对数据流运行事件检测')
+    parser.add_argument('stream', nargs='?', help='录制的串口数据文件（可以是.gz），省略时使用模拟数据')
+    parser.add_argument('--filter', default=FILTER_CONFIG, help='滤波预置名称')
+    parser.add_argument('--sensors', type=int, default=1, help='把同一数据流当作多个传感器处理，用于测量开销')
+    args = parser.parse_args()
+
+    if args.stream:
+        data = load_stream(args.stream)
+    else:
+        from fake_device import generate_stream
+        data = generate_stream(30)
+    samples, poses, _ = process_block(ChunkParser().feed(data), FilterBank(args.filter), ComplementaryFilter())
+    times = np.arange(len(samples)) / DEFAULT_FS
+
+    engine = EventEngine(outputs=[print_event] if args.sensors == 1 else [])
+    start = time.perf_counter()
+    for sensor in range(args.sensors):
+        engine.process(times, samples, poses, sensor)
+    elapsed = time.perf_counter() - start
+    total = len(samples) * args.sensors
+    print(f"{total} 个样本，事件: {engine.counts or '无'}")
+    print(f"每个样本 {elapsed / max(total, 1) * 1e6:.1f} 微秒，"
+          f"{DEFAULT_FS:.0f}Hz时占用单核 {elapsed / max(total, 1) * DEFAULT_FS * 100:.3f}% / 传感器")
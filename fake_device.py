@@ -0,0 +1,144 @@
+import os
+import math
+import time
+import random
+import select
+import threading
+from signal_filters import GYRO_SCALE
+
+# 基于pty的虚拟BMI160设备，输出格式与bmi160_esp32.ino一致
+# 没有硬件时（例如CI环境）可以代替ESP32，串口程序直接打开 device.port 即可
+
+FILTER_ALPHA = 0.8  # 与固件一致的低通系数
+
+
+class SensorModel:
+    # 模拟的运动和固件的数据处理，不依赖串口，可以单独用于生成数据流
+    def __init__(self, seed=0, noise=0.01):
+        self.noise = noise
+        self.rng = random.Random(seed)
+        # 与固件一致：默认输出板上滤波后的数据
+        self.raw_output = False
+        self.prev = [0.0] * 6
+
+    def sample(self, t):
+        # 绕X轴和Y轴缓慢摆动，绕Z轴匀速旋转
+        w = 2 * math.pi * 0.2
+        roll = math.radians(30) * math.sin(w * t)
+        pitch = math.radians(20) * math.sin(0.5 * w * t)
+        ax = -math.sin(pitch)
+        ay = math.cos(pitch) * math.sin(roll)
+        az = math.cos(pitch) * math.cos(roll)
+        gx = math.degrees(math.radians(30) * w * math.cos(w * t))
+        gy = math.degrees(math.radians(20) * 0.5 * w * math.cos(0.5 * w * t))
+        gz = 20.0
+        data = [v + self.rng.gauss(0, self.noise) for v in (ax, ay, az, gx, gy, gz)]
+        if not self.raw_output:
+            data = [FILTER_ALPHA * v + (1-FILTER_ALPHA) * p for v, p in zip(data, self.prev)]
+            self.prev = data
+            data = data[:3] + [g * GYRO_SCALE for g in data[3:]]
+        return data
+
+
+def generate_stream(seconds, rate=100.0, seed=0, noise=0.01, raw_output=True, error_every=0):
+    # 按固定采样间隔生成完整的串口输出（启动信息 + 数据行），结果只取决于参数
+    # error_every 不为0时每隔若干行插入一行固件的错误信息
+    model = SensorModel(seed, noise)
+    model.raw_output = raw_output
+    lines = ["BMI160初始化开始...", "BMI160初始化成功", "DATA_BEGIN"]
+    for i in range(int(seconds * rate)):
+        if error_every and i % error_every == error_every - 1:
+            lines.append("读取数据失败，错误代码：-2")
+        lines.append(",".join(f"{v:.4f}" for v in model.sample(i / rate)))
+    return ("\r\n".join(lines) + "\r\n").encode('utf-8')
+
+
+class FakeDevice:
+    def __init__(self, rate=100.0, seed=0, noise=0.01, boot_delay=1.0):
+        self.rate = rate
+        # 模拟固件setup()中的启动延迟，上位机打开串口时会清空输入缓冲，
+        # 启动信息必须在打开之后才发出
+        self.boot_delay = boot_delay
+        self.model = SensorModel(seed, noise)
+        # pty只在类Unix系统上可用；SensorModel/generate_stream 不需要它，
+        # 基准回放和事件检测在Windows上也能导入本模块
+        import tty
+        self.master, self.slave = os.openpty()
+        # 关闭回显等行规程处理，表现得和真实串口一样
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        # 上位机不读取时缓冲区会满，此时丢弃数据而不是阻塞
+        os.set_blocking(self.master, False)
+        # 'R'/'F' 切换原始/滤波输出，'T'/'t' 开启/关闭设备时间戳
+        self.timestamps = False
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        os.close(self.master)
+        os.close(self.slave)
+
+    def millis(self):
+        # 设备时间使用主机的单调时钟，这样测得的传输延迟是绝对值
+        return time.monotonic() * 1000.0
+
+    def _write(self, line):
+        try:
+            os.write(self.master, (line + "\r\n").encode('utf-8'))
+        except BlockingIOError:
+            pass
+
+    def _handle_commands(self):
+        while select.select([self.master], [], [], 0)[0]:
+            for cmd in os.read(self.master, 64).decode('ascii', errors='ignore'):
+                if cmd == 'R':
+                    self.model.raw_output = True
+                    self._write("MODE_RAW")
+                elif cmd == 'F':
+                    self.model.raw_output = False
+                    self._write("MODE_FILTERED")
+                elif cmd == 'T':
+                    self.timestamps = True
+                    self._write("MODE_TIMESTAMP")
+                elif cmd == 't':
+                    self.timestamps = False
+                    self._write("MODE_NO_TIMESTAMP")
+
+    def _run(self):
+        time.sleep(self.boot_delay)
+        self._write("BMI160初始化开始...")
+        self._write("BMI160初始化成功")
+        self._write("DATA_BEGIN")
+        start = time.monotonic()
+        next_time = start
+        while self.running:
+            self._handle_commands()
+            now = time.monotonic()
+            fields = [f"{v:.4f}" for v in self.model.sample(now - start)]
+            if self.timestamps:
+                fields.append(f"{self.millis():.3f}")
+            self._write(",".join(fields))
+            next_time += 1.0 / self.rate
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+if __name__ == "__main__":
+    device = FakeDevice().start()
+    print(f"虚拟设备已启动: {device.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        device.stop()
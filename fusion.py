@@ -0,0 +1,125 @@
+import math
+import numpy as np
+from signal_filters import GYRO_SCALE
+
+# 处理链配置：两个可视化程序、延迟测量和基准回放都使用这里的设置
+# DEVICE_RAW 为 True 时请求固件发送未滤波的原始数据，由上位机滤波链处理，陀螺仪数据乘 GYRO_SCALE；
+# 为 False 时固件仍做板上滤波（已缩放），FILTER_CONFIG 会叠加在其后
+DEVICE_RAW = True
+# 可选预置 'raw'/'legacy'/'smooth'/'notch'，或自定义滤波级列表（见signal_filters.py）
+# 'legacy' 与旧固件的 0.8 低通一致；'raw' 延迟最小
+FILTER_CONFIG = 'legacy'
+# 固件的采样间隔（秒）
+SAMPLE_DT = 0.01
+# 积分时的角速度增益
+GYRO_GAIN = 0.5
+# 互补滤波系数
+ALPHA = 0.8
+
+
+class ComplementaryFilter:
+    # 互补滤波姿态解算：陀螺仪积分 + 加速度计修正roll和pitch
+    def __init__(self, dt=SAMPLE_DT, gyro_gain=GYRO_GAIN, alpha=ALPHA):
+        self.dt = dt
+        # 降低角速度的增益，使旋转更接近实际
+        self.gyro_gain = gyro_gain
+        # 互补滤波系数，越小加速度计的影响越大
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        self.roll = self.pitch = self.yaw = 0.0
+
+    def update(self, ax, ay, az, gx, gy, gz):
+        self.roll += gx * self.dt * self.gyro_gain
+        self.pitch += gy * self.dt * self.gyro_gain
+        self.yaw += gz * self.dt * self.gyro_gain
+
+        # 使用加速度计数据修正roll和pitch
+        roll_acc = math.atan2(ay, az) * 180/math.pi
+        pitch_acc = math.atan2(-ax, math.sqrt(ay*ay + az*az)) * 180/math.pi
+
+        alpha = self.alpha
+        self.roll = alpha * self.roll + (1-alpha) * roll_acc
+        self.pitch = alpha * self.pitch + (1-alpha) * pitch_acc
+        return self.roll, self.pitch, self.yaw
+
+
+class PositionIntegrator:
+    # 加速度积分得到速度和位置：静止时校准重力偏移，之后做死区、坐标映射、限速、阻尼和限位
+    def __init__(self, scale_factor=2.0, calibration_samples=100, dead_zone=0.001,
+                 max_velocity=5.0, damping=0.95, max_position=10.0):
+        self.scale_factor = scale_factor
+        self.calibration_samples = calibration_samples
+        self.dead_zone = dead_zone
+        self.max_velocity = max_velocity
+        self.damping = damping
+        self.max_position = max_position
+        self.gravity_offset = [0, 0, 0]
+        self.position = [0.0, 0.0, 0.0]
+        self.velocity = [0.0, 0.0, 0.0]
+        self.calibrate()
+
+    def calibrate(self):
+        # 重新收集重力样本，假设此时传感器处于静止状态
+        self.is_calibrating = True
+        self.gravity_samples = []
+
+    def reset(self):
+        # 原地清零，外部持有的列表引用保持有效
+        self.position[:] = [0.0, 0.0, 0.0]
+        self.velocity[:] = [0.0, 0.0, 0.0]
+
+    def update(self, ax, ay, az, dt):
+        # 返回映射到OpenGL坐标系的加速度；校准阶段只收集样本，返回 None
+        if self.is_calibrating:
+            self.gravity_samples.append([ax, ay, az])
+            if len(self.gravity_samples) >= self.calibration_samples:
+                self.gravity_offset = [sum(axis) / len(self.gravity_samples) for axis in zip(*self.gravity_samples)]
+                self.is_calibrating = False
+                self.reset()
+            return None
+
+        # 补偿重力
+        ax -= self.gravity_offset[0]
+        ay -= self.gravity_offset[1]
+        az -= self.gravity_offset[2]
+
+        # 死区，忽略极小的加速度变化
+        if abs(ax) < self.dead_zone: ax = 0
+        if abs(ay) < self.dead_zone: ay = 0
+        if abs(az) < self.dead_zone: az = 0
+
+        # 坐标系转换: BMI160 -> OpenGL
+        # 翻转X轴，BMI160的Z轴映射到OpenGL的Y轴，Y轴映射到OpenGL的Z轴
+        mapped = (-ax, az, ay)
+
+        for i in range(3):
+            # 加速度直接影响速度，限制最大速度防止飞出视野，再施加阻尼
+            v = max(min(mapped[i] * self.scale_factor, self.max_velocity), -self.max_velocity)
+            self.velocity[i] = v * self.damping
+            # 速度积分获得位置，并限制范围
+            p = self.position[i] + self.velocity[i] * dt
+            self.position[i] = max(min(p, self.max_position), -self.max_position)
+        return mapped
+
+
+def process_block(rows, filter_bank, attitude=None, integrator=None, dt=SAMPLE_DT, device_raw=DEVICE_RAW):
+    # 一块串口数据的处理：滤波 → 陀螺仪缩放 → 姿态融合 / 位置积分，所有使用者共用这一个函数
+    # 返回 (滤波后的样本, 每个样本的姿态 (N, 3), 每个样本的位置和速度 (N, 6))，
+    # 没有传入的解算器对应的结果为 None；位置积分在校准阶段的样本为 NaN
+    samples = filter_bank.process(rows)
+    if device_raw:
+        samples[:, 3:] *= GYRO_SCALE
+    poses = None
+    if attitude is not None:
+        poses = np.array([attitude.update(ax, ay, az, gx, gy, gz)
+                          for ax, ay, az, gx, gy, gz in samples]).reshape(-1, 3)
+    states = None
+    if integrator is not None:
+        states = np.full((len(samples), 6), np.nan)
+        for i, (ax, ay, az) in enumerate(samples[:, :3]):
+            if integrator.update(ax, ay, az, dt) is not None:
+                states[i, :3] = integrator.position
+                states[i, 3:] = integrator.velocity
+    return samples, poses, states
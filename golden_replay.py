@@ -0,0 +1,181 @@
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+import numpy as np
+from signal_filters import FilterBank
+from fusion import ComplementaryFilter, PositionIntegrator, process_block
+from stream_parser import ChunkParser
+from fake_device import generate_stream
+from trajectory_store import TrajectoryWriter, TrajectoryReader
+
+# 基准回放：把固定的数据流无窗口地送进与可视化程序相同的处理链
+# （分块解析 → 滤波 → 姿态融合 / 位置积分），输出与保存的基准轨迹逐样本比较，
+# 同时测量吞吐量。修改性能相关代码后运行一次，确认结果没有变化、速度有没有提高。
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+RESULT_LOG = os.path.join('recordings', 'replay_results.jsonl')
+SAMPLE_RATE = 100.0
+
+CHANNELS = ['roll', 'pitch', 'yaw', 'x', 'y', 'z', 'vx', 'vy', 'vz']
+
+# 每个量允许的最大绝对误差：姿态单位为度，位置和速度与 position_tracking.py 一致
+TOLERANCES = {
+    'roll': 1e-6, 'pitch': 1e-6, 'yaw': 1e-6,
+    'x': 1e-9, 'y': 1e-9, 'z': 1e-9,
+    'vx': 1e-9, 'vy': 1e-9, 'vz': 1e-9,
+}
+
+# 内置回放用例：数据流由 fake_device.generate_stream 生成，第一次生成后保存在 golden 目录，
+# 之后始终回放保存的字节，不受不同平台数学库的影响
+CASES = {
+    'legacy': {'filter': 'legacy', 'seconds': 10, 'seed': 1, 'error_every': 0},
+    'smooth': {'filter': 'smooth', 'seconds': 10, 'seed': 2, 'error_every': 97},
+    'notch': {'filter': 'notch', 'seconds': 10, 'seed': 3, 'error_every': 0},
+}
+
+# 用不同的分块大小各运行一次，结果必须逐位相同（第一个用于计时）
+CHUNK_SIZES = (4096, 61)
+
+
+def run_pipeline(data, filter_config, chunk_size=4096, rate=SAMPLE_RATE):
+    # 与 cube_visualization.main() / position_tracking.main() 使用同一个 process_block，
+    # 时间步长使用固定采样间隔，而不是渲染帧的时间
+    parser = ChunkParser()
+    filter_bank = FilterBank(filter_config, fs=rate)
+    attitude = ComplementaryFilter()
+    integrator = PositionIntegrator()
+    out = []
+    for start in range(0, len(data), chunk_size):
+        rows = parser.feed(data[start:start + chunk_size])
+        if not len(rows):
+            continue
+        _, poses, states = process_block(rows, filter_bank, attitude, integrator, dt=1.0 / rate)
+        out.append(np.hstack((poses, states)))
+    if not out:
+        return np.empty((0, len(CHANNELS)))
+    return np.concatenate(out)
+
+
+def load_stream(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        return f.read()
+
+
+def save_golden(path, trace, rate=SAMPLE_RATE):
+    # 使用轨迹文件格式保存，第0层无损，可以直接用 trajectory_store.py 查看
+    writer = TrajectoryWriter(path, CHANNELS, levels=0)
+    writer.extend(np.arange(len(trace)) / rate, trace)
+    writer.close()
+
+
+def load_golden(path):
+    reader = TrajectoryReader(path)
+    trace = reader.query(-np.inf, np.inf, level=0)['mean']
+    reader.close()
+    return trace
+
+
+def compare(trace, golden, tolerances=TOLERANCES):
+    # 返回每个量的 (最大误差, 第一个超差样本的序号或None)
+    if trace.shape != golden.shape:
+        return None
+    result = {}
+    for i, name in enumerate(CHANNELS):
+        error = np.abs(trace[:, i] - golden[:, i])
+        # 两边都是 NaN（位置积分的校准阶段）算一致，只有一边是 NaN 算超差
+        both_nan = np.isnan(trace[:, i]) & np.isnan(golden[:, i])
+        failed = np.flatnonzero(~(error <= tolerances[name]) & ~both_nan)
+        result[name] = (float(np.nanmax(error)) if len(error) else 0.0,
+                        int(failed[0]) if len(failed) else None)
+    return result
+
+
+def replay(name, data, filter_config, golden_path, update=False, repeat=3):
+    traces = [run_pipeline(data, filter_config, chunk_size) for chunk_size in CHUNK_SIZES]
+    deterministic = all(np.array_equal(traces[0], t, equal_nan=True) for t in traces[1:])
+
+    # 吞吐量取多次运行中最快的一次，减少系统调度的干扰
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_pipeline(data, filter_config, CHUNK_SIZES[0])
+        best = min(best, time.perf_counter() - start)
+    trace = traces[0]
+    throughput = len(trace) / best
+
+    if update:
+        save_golden(golden_path, trace)
+    if not os.path.exists(golden_path):
+        errors = None
+        print(f"{name}: 缺少基准文件 {golden_path}，请先运行 --update")
+    else:
+        golden = load_golden(golden_path)
+        errors = compare(trace, golden)
+        if errors is None:
+            print(f"{name}: 样本数不一致，输出 {len(trace)}，基准 {len(golden)}")
+
+    passed = deterministic and errors is not None and all(first is None for _, first in errors.values())
+    print(f"{name}: {len(trace)} 样本  滤波 {filter_config}  吞吐量 {throughput:,.0f} 样本/秒  "
+          f"分块一致: {'是' if deterministic else '否'}  {'通过' if passed else '失败'}")
+    if errors is not None:
+        print("  最大误差: " + "  ".join(f"{channel}={max_error:.1e}" for channel, (max_error, _) in errors.items()))
+        for channel, (max_error, first) in errors.items():
+            if first is not None:
+                print(f"  {channel}: 超出容差 {TOLERANCES[channel]:.0e}，第{first}个样本起不一致")
+
+    return {
+        'case': name,
+        'filter': filter_config,
+        'samples': len(trace),
+        'throughput': throughput,
+        'deterministic': deterministic,
+        'max_error': {k: v[0] for k, v in errors.items()} if errors else None,
+        'passed': passed,
+        'updated': update,
+    }
+
+
+def replay_case(name, update=False):
+    case = CASES[name]
+    stream_path = os.path.join(GOLDEN_DIR, f"{name}.stream.gz")
+    if not os.path.exists(stream_path):
+        if not update:
+            print(f"{name}: 缺少数据流文件 {stream_path}，请先运行 --update")
+            return {'case': name, 'passed': False}
+        data = generate_stream(case['seconds'], SAMPLE_RATE, seed=case['seed'], error_every=case['error_every'])
+        # mtime固定为0，相同内容生成的文件逐字节相同
+        with gzip.GzipFile(stream_path, 'wb', mtime=0) as f:
+            f.write(data)
+    data = load_stream(stream_path)
+    return replay(name, data, case['filter'], os.path.join(GOLDEN_DIR, f"{name}.traj"), update)
+
+
+def log_results(results, path=RESULT_LOG):
+    # 每次运行追加一行，便于对比不同修改前后的吞吐量
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'results': results},
+                           ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='回放固定数据流，与基准轨迹比较并测量吞吐量')
+    parser.add_argument('cases', nargs='*', help=f"要运行的用例，默认全部: {', '.join(CASES)}")
+    parser.add_argument('--stream', help='回放录制的串口数据文件（可以是.gz），基准保存在同名.traj文件')
+    parser.add_argument('--filter', default='legacy', help='回放录制文件时使用的滤波预置')
+    parser.add_argument('--update', action='store_true', help='用当前输出重新生成基准轨迹')
+    args = parser.parse_args()
+
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    if args.stream:
+        golden_path = os.path.splitext(args.stream[:-3] if args.stream.endswith('.gz') else args.stream)[0] + '.traj'
+        results = [replay(os.path.basename(args.stream), load_stream(args.stream), args.filter,
+                          golden_path, args.update)]
+    else:
+        results = [replay_case(name, args.update) for name in (args.cases or CASES)]
+    log_results(results)
+    sys.exit(0 if all(r['passed'] for r in results) else 1)
@@ -0,0 +1,240 @@
+import os
+import math
+import time
+import queue
+import argparse
+import threading
+import numpy as np
+from signal_filters import FilterBank
+from fusion import ComplementaryFilter, process_block, DEVICE_RAW, FILTER_CONFIG
+from stream_parser import ChunkParser
+
+# 动作到显示（motion-to-photon）延迟测量
+# 所有主机时间戳都使用 time.monotonic()，设备时间戳为固件的 millis()（毫秒）
+
+# 各阶段名称，按数据流顺序排列
+STAGES = (
+    ('device_to_host', '设备→主机'),
+    ('host_queue', '主机排队'),
+    ('fusion', '滤波/融合'),
+    ('handling', '记录/事件'),
+    ('render', '渲染'),
+    ('swap', '交换缓冲'),
+    ('total', '总延迟'),
+)
+
+
+class LatencyTracker:
+    # 记录每一帧所显示的最新样本在各阶段的时间戳
+    # clock_offset 为设备时钟与主机时钟之差（秒）；为 None 时用最小传输时间估计，
+    # 此时“设备→主机”只反映高于最小值的那部分延迟
+    def __init__(self, clock_offset=None):
+        self.clock_offset = clock_offset
+        self.records = []
+        self.pending = None
+
+    def on_fused(self, device_ms, rx_time, fusion_start, fusion_end):
+        # 一个样本融合完成，它将成为下一帧所显示的最新样本
+        # rx_time 为该样本到达主机的时间（SerialReader 读线程从 read() 返回时记录），
+        # 主循环取出数据之前在队列中等待的时间计入“主机排队”
+        self.pending = (device_ms / 1000.0, rx_time, fusion_start, fusion_end, fusion_end)
+
+    def on_handled(self, handled_end):
+        # 融合结果的记录、事件检测等后续处理完成；不调用时这一阶段为0
+        if self.pending is not None:
+            self.pending = self.pending[:4] + (handled_end,)
+
+    def on_frame(self, flip_start, flip_end):
+        # 一帧显示完成；没有新样本的帧只是重复显示旧姿态，不计入统计
+        if self.pending is None:
+            return
+        self.records.append(self.pending + (flip_start, flip_end))
+        self.pending = None
+
+    def stages(self):
+        # 返回各阶段延迟（毫秒）
+        if not self.records:
+            return {}
+        r = np.array(self.records)
+        device, rx, fusion_start, fusion_end, handled_end, flip_start, flip_end = r.T
+        offset = self.clock_offset
+        if offset is None:
+            offset = np.min(rx - device)
+        return {
+            'device_to_host': (rx - device - offset) * 1000.0,
+            'host_queue': (fusion_start - rx) * 1000.0,
+            'fusion': (fusion_end - fusion_start) * 1000.0,
+            'handling': (handled_end - fusion_end) * 1000.0,
+            'render': (flip_start - handled_end) * 1000.0,
+            'swap': (flip_end - flip_start) * 1000.0,
+            'total': (flip_end - device - offset) * 1000.0,
+        }
+
+    def report(self, bins=10, width=40):
+        stages = self.stages()
+        if not stages:
+            return "没有延迟数据"
+        lines = [f"延迟统计（{len(self.records)} 帧，单位 ms）"]
+        for key, name in STAGES:
+            values = stages[key]
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            lines.append(f"{name}: p50={p50:.2f} p95={p95:.2f} p99={p99:.2f} max={values.max():.2f}")
+            counts, edges = np.histogram(values, bins=bins)
+            scale = width / max(counts.max(), 1)
+            for count, lo, hi in zip(counts, edges[:-1], edges[1:]):
+                bar = '#' * int(math.ceil(count * scale))
+                lines.append(f"  {lo:8.2f} - {hi:8.2f} | {bar} {count}")
+        return "\n".join(lines)
+
+
+class SerialReader:
+    # 后台线程阻塞在串口 read() 上，数据一到达就记录到达时间，主循环每帧取出 (到达时间, 数据)
+    # 如果在主循环里读取，数据在系统缓冲区中等待的时间会被算作“设备→主机”
+    def __init__(self, ser):
+        self.ser = ser
+        self.queue = queue.SimpleQueue()
+        self.running = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        # 串口超时后线程退出，之后才能安全关闭串口
+        self.running = False
+        self.thread.join()
+
+    def _run(self):
+        while self.running:
+            # 阻塞等待第一个字节，再读出已到达的其余数据
+            data = self.ser.read(1)
+            if not data:
+                continue
+            data += self.ser.read(self.ser.in_waiting)
+            self.queue.put((time.monotonic(), data))
+
+    def drain(self):
+        items = []
+        while True:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                return items
+
+
+def feed_arrivals(parser, arrivals):
+    # 按到达顺序解析读线程取得的数据，返回 (样本, 最后一个样本的到达时间)
+    blocks = []
+    rx_time = None
+    for arrival, chunk in arrivals:
+        rows = parser.feed(chunk)
+        if len(rows):
+            blocks.append(rows)
+            rx_time = arrival
+    if not blocks:
+        return np.empty((0, parser.fields)), None
+    return np.concatenate(blocks), rx_time
+
+
+# 用于无窗口运行的立方体顶点，与 cube_visualization.py 一致
+vertices = np.array((
+    (1, -1, -1), (1, 1, -1), (-1, 1, -1), (-1, -1, -1),
+    (1, -1, 1), (1, 1, 1), (-1, -1, 1), (-1, 1, 1)
+), dtype=float)
+
+edges = (
+    (0,1), (0,3), (0,4), (2,1), (2,3), (2,7),
+    (6,3), (6,4), (6,7), (5,1), (5,4), (5,7)
+)
+
+
+def rotation_matrix(roll, pitch, yaw):
+    # 与 glRotatef(roll,1,0,0) -> glRotatef(pitch,0,1,0) -> glRotatef(yaw,0,0,1) 相同的顺序
+    r, p, y = (math.radians(a) for a in (roll, pitch, yaw))
+    rx = np.array(((1, 0, 0), (0, math.cos(r), -math.sin(r)), (0, math.sin(r), math.cos(r))))
+    ry = np.array(((math.cos(p), 0, math.sin(p)), (0, 1, 0), (-math.sin(p), 0, math.cos(p))))
+    rz = np.array(((math.cos(y), -math.sin(y), 0), (math.sin(y), math.cos(y), 0), (0, 0, 1)))
+    return rx @ ry @ rz
+
+
+def draw_cube_2d(screen, roll, pitch, yaw):
+    # 软件投影绘制立方体线框，用于没有OpenGL的环境
+    import pygame
+    w, h = screen.get_size()
+    points = vertices @ rotation_matrix(roll, pitch, yaw).T
+    depth = points[:, 2] + 5.0
+    xy = points[:, :2] / depth[:, None] * (h * 1.2)
+    xy[:, 1] = -xy[:, 1]
+    xy += (w / 2, h / 2)
+    screen.fill((51, 51, 51))
+    for a, b in edges:
+        pygame.draw.line(screen, (255, 255, 255), xy[a], xy[b], 2)
+
+
+def run_headless(port, frames=500, filter_config=FILTER_CONFIG, clock_offset=None):
+    # 按照 cube_visualization.main() 的流程读取、融合并显示，但使用软件渲染
+    # 可以配合 fake_device.FakeDevice 在没有硬件和显示器的环境下运行
+    import serial
+    ser = serial.Serial(port, 115200, timeout=1)
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    pygame.init()
+    screen = pygame.display.set_mode((400, 300))
+
+    start_wait_time = time.monotonic()
+    while ser.readline().decode('utf-8', errors='ignore').strip() != "DATA_BEGIN":
+        if time.monotonic() - start_wait_time > 10:
+            raise RuntimeError("等待DATA_BEGIN标记超时")
+    # 请求设备时间戳，与可视化程序一样按 DEVICE_RAW 请求原始数据或板上滤波
+    ser.write(b'RT' if DEVICE_RAW else b'FT')
+
+    parser = ChunkParser(fields=7)
+    filter_bank = FilterBank(filter_config)
+    attitude = ComplementaryFilter()
+    tracker = LatencyTracker(clock_offset)
+    reader = SerialReader(ser).start()
+    while len(tracker.records) < frames:
+        pygame.event.pump()
+        rows, rx_time = feed_arrivals(parser, reader.drain())
+        if len(rows):
+            fusion_start = time.monotonic()
+            process_block(rows[:, :6], filter_bank, attitude)
+            tracker.on_fused(rows[-1, 6], rx_time, fusion_start, time.monotonic())
+
+        draw_cube_2d(screen, attitude.roll, attitude.pitch, attitude.yaw)
+        flip_start = time.monotonic()
+        pygame.display.flip()
+        tracker.on_frame(flip_start, time.monotonic())
+        pygame.time.wait(10)
+
+    reader.stop()
+    ser.close()
+    pygame.quit()
+    return tracker
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='测量动作到显示的延迟')
+    parser.add_argument('--port', help='串口名称，省略时使用pty虚拟设备')
+    parser.add_argument('--frames', type=int, default=500, help='统计的帧数')
+    parser.add_argument('--filter', default=FILTER_CONFIG, help='滤波预置名称')
+    args = parser.parse_args()
+
+    device = None
+    port = args.port
+    clock_offset = None
+    if port is None:
+        from fake_device import FakeDevice
+        device = FakeDevice().start()
+        port = device.port
+        # 虚拟设备与主机共用单调时钟
+        clock_offset = 0.0
+        print(f"使用虚拟设备: {port}")
+
+    tracker = run_headless(port, args.frames, args.filter, clock_offset)
+    if device is not None:
+        device.stop()
+    print(tracker.report())
@@ -8,11 +8,22 @@ import math
 import time
 from collections import deque
 import os
+from signal_filters import FilterBank
+from fusion import PositionIntegrator, process_block, DEVICE_RAW, FILTER_CONFIG
+from stream_parser import ChunkParser, print_malformed
+from trajectory_store import TrajectoryWriter, TrajectoryReader, new_recording_path
+
+# 上位机滤波配置（DEVICE_RAW、FILTER_CONFIG）在 fusion.py 中，与其他程序共用
 
 # 轨迹历史数据，保存最近的位置点
 MAX_TRAIL_LENGTH = 1000
 position_history = deque(maxlen=MAX_TRAIL_LENGTH)
 
+# 完整轨迹保存在 recordings 目录下，可以用左右方向键回看
+RECORD_DIR = 'recordings'
+SCRUB_STEP = 5.0     # 每次按键回退/前进的秒数
+SCRUB_WINDOW = 30.0  # 回放时显示的轨迹时长
+
 # 初始位置
 position = [0.0, 0.0, 0.0]
 velocity = [0.0, 0.0, 0.0]
@@ -108,8 +119,11 @@ def draw_position_sphere():
     glEnable(GL_DEPTH_TEST)
 
 # 绘制移动轨迹
-def draw_trail():
-    if len(position_history) < 2:
+def draw_trail(points=None):
+    # 默认绘制实时轨迹，回放时绘制从轨迹文件中读出的点
+    if points is None:
+        points = position_history
+    if len(points) < 2:
         return
     
     # 禁用深度测试，确保轨迹始终可见
@@ -118,9 +132,9 @@ def draw_trail():
     glBegin(GL_LINE_STRIP)
     
     # 使用更亮的渐变色显示轨迹
-    for i, pos in enumerate(position_history):
+    for i, pos in enumerate(points):
         # 根据点的新旧程度设置颜色
-        alpha = i / len(position_history)
+        alpha = i / len(points)
         glColor3f(1.0, alpha, 0.0)  # 从红色到黄色的渐变
         glVertex3f(pos[0], pos[1], pos[2])
     
@@ -230,12 +244,32 @@ def main():
         pygame.event.pump()  # 保持窗口响应
         time.sleep(0.1)
     
+    # 请求原始数据或板上滤波并建立上位机滤波链；每次都明确发送，
+    # 上一次会话切换的模式在设备没有复位时仍然有效
+    if ser:
+        ser.write(b'R' if DEVICE_RAW else b'F')
+    filter_bank = FilterBank(FILTER_CONFIG)
+    print(f"滤波配置: {FILTER_CONFIG}")
+    print(filter_bank.describe())
+    
+    # 关闭设备时间戳：上一次延迟测量后设备没有复位时仍会发送7列数据
+    if ser:
+        ser.write(b't')
+    
+    # 串口数据块解析器，非数据行（如固件的错误信息）交给诊断输出
+    parser = ChunkParser(on_malformed=print_malformed)
+    
     # 相机控制参数
     camera_distance = 20.0  # 增加相机距离，扩大视野
     camera_yaw = 0
     camera_pitch = 30
     clock = pygame.time.Clock()
     
+    # 初始相机位置，校准画面在第一帧渲染之前就会用到
+    cx = camera_distance * math.cos(math.radians(camera_pitch)) * math.sin(math.radians(camera_yaw))
+    cy = camera_distance * math.sin(math.radians(camera_pitch))
+    cz = camera_distance * math.cos(math.radians(camera_pitch)) * math.cos(math.radians(camera_yaw))
+    
     # 是否自动重置轨迹
     auto_reset = True
     last_reset_time = time.time()
@@ -244,22 +278,28 @@ def main():
     reset_key_pressed = False
     reset_ball_position = False
     
-    # 键盘控制缩放因子的变量
-    current_scale_factor = 2.0  # 默认缩放因子
-    
     # 上一次时间戳，用于计算时间间隔
     last_time = time.time()
     
-    # 重力补偿，假设开始时传感器处于静止状态
-    gravity_offset = [0, 0, 0]
-    gravity_samples = []
-    calibration_count = 0
-    is_calibrating = True
-    
     # 模拟演示模式的变量
     demo_mode = ser is None
     demo_angle = 0
     
+    # 加速度积分：开始时校准重力偏移（演示模式下只收集30个样本），缩放因子可用上下键调整
+    integrator = PositionIntegrator(scale_factor=2.0, calibration_samples=30 if demo_mode else 100)
+    position = integrator.position
+    velocity = integrator.velocity
+    
+    # 轨迹记录：位置和速度写入压缩文件，回放时从同一文件读取
+    record_path = new_recording_path(RECORD_DIR, 'position')
+    recorder = TrajectoryWriter(record_path, ['x', 'y', 'z', 'vx', 'vy', 'vz'])
+    playback = TrajectoryReader(record_path)
+    scrub_offset = 0.0  # 回放位置距离当前的秒数，0表示实时
+    print(f"轨迹记录到: {record_path}")
+    
+    # 校准完成的时间，完成信息显示2秒（不阻塞主循环，串口数据照常处理）
+    calibration_done_time = None
+    
     # 主循环
     while True:
         current_time = time.time()
@@ -270,12 +310,13 @@ def main():
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
-                ser.close()
+                if ser: ser.close()
+                recorder.close()
+                playback.close()
                 return
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_r:  # 手动重置轨迹
-                    position = [0.0, 0.0, 0.0]
-                    velocity = [0.0, 0.0, 0.0]
+                    integrator.reset()
                     position_history.clear()
                     reset_ball_position = True
                     reset_key_pressed = True
@@ -283,19 +324,25 @@ def main():
                     auto_reset = not auto_reset
                     print(f"自动重置: {'开启' if auto_reset else '关闭'}")
                 elif event.key == pygame.K_c:  # 重新校准
-                    is_calibrating = True
-                    calibration_count = 0
-                    gravity_samples = []
+                    integrator.calibrate()
                     print("开始重新校准...")
                 elif event.key == pygame.K_UP:  # 增加敏感度
-                    current_scale_factor *= 1.2
-                    print(f"增加敏感度，当前比例: {current_scale_factor:.2f}")
+                    integrator.scale_factor *= 1.2
+                    print(f"增加敏感度，当前比例: {integrator.scale_factor:.2f}")
                 elif event.key == pygame.K_DOWN:  # 降低敏感度
-                    current_scale_factor /= 1.2
-                    print(f"降低敏感度，当前比例: {current_scale_factor:.2f}")
+                    integrator.scale_factor /= 1.2
+                    print(f"降低敏感度，当前比例: {integrator.scale_factor:.2f}")
+                elif event.key == pygame.K_LEFT:  # 回看更早的轨迹
+                    scrub_offset += SCRUB_STEP
+                    print(f"回放: {scrub_offset:.0f}秒前")
+                elif event.key == pygame.K_RIGHT:  # 向实时方向前进
+                    scrub_offset = max(0.0, scrub_offset - SCRUB_STEP)
+                    print(f"回放: {scrub_offset:.0f}秒前" if scrub_offset else "回到实时显示")
                 elif event.key == pygame.K_ESCAPE:  # 退出
                     pygame.quit()
                     if ser: ser.close()
+                    recorder.close()
+                    playback.close()
                     return
             
             elif event.type == pygame.KEYUP:
@@ -319,13 +366,12 @@ def main():
 
         # 如果R键被按住，持续重置球的位置
         if reset_key_pressed:
-            position = [0.0, 0.0, 0.0]
+            position[:] = [0.0, 0.0, 0.0]
             reset_ball_position = True
         
         # 自动重置轨迹（每30秒）
         if auto_reset and time.time() - last_reset_time > 30:
-            position = [0.0, 0.0, 0.0]
-            velocity = [0.0, 0.0, 0.0]
+            integrator.reset()
             position_history.clear()
             last_reset_time = time.time()
         
@@ -345,73 +391,23 @@ def main():
                 ax += (np.random.random() - 0.5) * 0.8
                 ay += (np.random.random() - 0.5) * 0.8
             
-            if is_calibrating:
-                gravity_samples.append([ax, ay, az])
-                calibration_count += 1
-                
-                if calibration_count >= 30:  # 演示模式下只收集30个样本
-                    gravity_offset = np.mean(gravity_samples, axis=0)
-                    is_calibrating = False
-                    print(f"演示模式校准完成，重力偏移: {gravity_offset}")
-                    position = [0.0, 0.0, 0.0]
-                    velocity = [0.0, 0.0, 0.0]
+            mapped = integrator.update(ax, ay, az, dt)
+            if mapped is None:
+                if not integrator.is_calibrating:
+                    print(f"演示模式校准完成，重力偏移: {integrator.gravity_offset}")
                     position_history.clear()
+                    calibration_done_time = current_time
             else:
-                # 补偿重力
-                ax -= gravity_offset[0]
-                ay -= gravity_offset[1]
-                az -= gravity_offset[2]
-                
-                # 设置一个死区，忽略极小的加速度变化
-                dead_zone = 0.001  # 大幅降低死区，几乎立即响应任何移动
-                if abs(ax) < dead_zone: ax = 0
-                if abs(ay) < dead_zone: ay = 0
-                if abs(az) < dead_zone: az = 0
-                
-                # 应用加速度积分获得速度（演示模式下更敏感）
-                scale_factor = current_scale_factor  # 使用当前缩放因子
-                
-                # 调整坐标映射，BMI160的坐标系可能与OpenGL不同
-                # 进行坐标系转换: BMI160 -> OpenGL
-                ax_mapped = -ax  # 翻转X轴
-                ay_mapped = az   # BMI160的Z轴映射到OpenGL的Y轴
-                az_mapped = ay   # BMI160的Y轴映射到OpenGL的Z轴
-                
-                # 直接影响速度，但使用较小的缩放因子
-                velocity[0] = ax_mapped * scale_factor
-                velocity[1] = ay_mapped * scale_factor
-                velocity[2] = az_mapped * scale_factor
-                
-                # 限制最大速度，防止飞出视野
-                max_velocity = 5.0
-                velocity[0] = max(min(velocity[0], max_velocity), -max_velocity)
-                velocity[1] = max(min(velocity[1], max_velocity), -max_velocity)
-                velocity[2] = max(min(velocity[2], max_velocity), -max_velocity)
-                
-                # 应用阻尼，略微增大阻尼以增加控制性
-                damping = 0.95
-                velocity[0] *= damping
-                velocity[1] *= damping
-                velocity[2] *= damping
-                
-                # 应用速度积分获得位置
-                position[0] += velocity[0] * dt
-                position[1] += velocity[1] * dt
-                position[2] += velocity[2] * dt
-                
-                # 限制最大位置范围，防止飞出视野
-                max_position = 10.0
-                position[0] = max(min(position[0], max_position), -max_position)
-                position[1] = max(min(position[1], max_position), -max_position)
-                position[2] = max(min(position[2], max_position), -max_position)
-                
                 # 打印加速度和位置，用于调试
                 if pygame.time.get_ticks() % 1000 < 16:  # 每秒打印一次
                     print(f"原始加速度: ({ax:.3f}, {ay:.3f}, {az:.3f})")
-                    print(f"映射加速度: ({ax_mapped:.3f}, {ay_mapped:.3f}, {az_mapped:.3f})")
+                    print(f"映射加速度: ({mapped[0]:.3f}, {mapped[1]:.3f}, {mapped[2]:.3f})")
                     print(f"当前速度: ({velocity[0]:.3f}, {velocity[1]:.3f}, {velocity[2]:.3f})")
                     print(f"当前位置: ({position[0]:.3f}, {position[1]:.3f}, {position[2]:.3f})")
                 
+                # 完整轨迹写入文件
+                recorder.append(current_time, position + velocity)
+                
                 # 只在移动时才记录位置历史，并且降低记录频率，避免轨迹过密
                 if (abs(velocity[0]) > 0.01 or abs(velocity[1]) > 0.01 or abs(velocity[2]) > 0.01) and pygame.time.get_ticks() % 2 == 0:
                     position_history.append(position.copy())
@@ -419,125 +415,67 @@ def main():
             data_processed = True
         
         elif ser and ser.in_waiting:  # 有串口且有数据
-            try:
-                line = ser.readline().decode('utf-8', errors='ignore').strip()
+            # 一次读出缓冲区中的所有数据并整块解析，格式错误的行只计数不抛出异常
+            rows = parser.feed(ser.read(ser.in_waiting))
+            if len(rows):
+                # 本帧的时间步长分摊到这一块的每个样本上
+                sample_dt = dt / len(rows)
+                sample_times = current_time - dt + sample_dt * np.arange(1, len(rows) + 1)
                 
-                # 忽略非数据行
-                if ',' not in line:
-                    continue
-                    
-                data = [float(x) for x in line.split(',')]
-                if len(data) == 6:
-                    ax, ay, az, gx, gy, gz = data
-                    
-                    # 校准阶段：收集初始重力样本
-                    if is_calibrating:
-                        gravity_samples.append([ax, ay, az])
-                        calibration_count += 1
-                        
-                        # 在校准过程中绘制当前收集的样本数量
-                        glClearColor(0.1, 0.1, 0.2, 1)
-                        glClear(GL_COLOR_BUFFER_BIT|GL_DEPTH_BUFFER_BIT)
-                        glLoadIdentity()
-                        gluLookAt(cx, cy, cz, 0, 0, 0, 0, 1, 0)
-                        draw_grid()
-                        draw_axes()
-                        
-                        # 在屏幕上显示校准进度
-                        font = get_font()
-                        progress_text = f"校准中... {calibration_count}/100"
-                        textSurface = font.render(progress_text, True, (255, 255, 255))
-                        textData = pygame.image.tostring(textSurface, "RGBA", True)
-                        glWindowPos2d(display[0]//2 - 100, display[1]//2)
-                        glDrawPixels(textSurface.get_width(), textSurface.get_height(), GL_RGBA, GL_UNSIGNED_BYTE, textData)
-                        
-                        pygame.display.flip()
-                        
-                        if calibration_count >= 100:  # 收集100个样本
-                            # 计算平均重力偏移
-                            gravity_offset = np.mean(gravity_samples, axis=0)
-                            is_calibrating = False
-                            print(f"校准完成，重力偏移: {gravity_offset}")
-                            position = [0.0, 0.0, 0.0]
-                            velocity = [0.0, 0.0, 0.0]
-                            position_history.clear()
-                            
-                            # 显示校准完成信息
-                            font = get_font()
-                            complete_text = f"校准完成! 重力偏移: {gravity_offset[0]:.4f}, {gravity_offset[1]:.4f}, {gravity_offset[2]:.4f}"
-                            textSurface = font.render(complete_text, True, (0, 255, 0))
-                            textData = pygame.image.tostring(textSurface, "RGBA", True)
-                            glWindowPos2d(display[0]//2 - 200, display[1]//2)
-                            glDrawPixels(textSurface.get_width(), textSurface.get_height(), GL_RGBA, GL_UNSIGNED_BYTE, textData)
-                            
-                            pygame.display.flip()
-                            time.sleep(2)  # 显示2秒校准结果
-                        continue
-                    
-                    # 补偿重力
-                    ax -= gravity_offset[0]
-                    ay -= gravity_offset[1]
-                    az -= gravity_offset[2]
-                    
-                    # 设置一个死区，忽略极小的加速度变化
-                    dead_zone = 0.001  # 大幅降低死区，几乎立即响应任何移动
-                    if abs(ax) < dead_zone: ax = 0
-                    if abs(ay) < dead_zone: ay = 0
-                    if abs(az) < dead_zone: az = 0
-                    
-                    # 应用加速度积分获得速度
-                    scale_factor = current_scale_factor  # 使用当前缩放因子
-                    
-                    # 调整坐标映射，BMI160的坐标系可能与OpenGL不同
-                    # 进行坐标系转换: BMI160 -> OpenGL
-                    ax_mapped = -ax  # 翻转X轴
-                    ay_mapped = az   # BMI160的Z轴映射到OpenGL的Y轴
-                    az_mapped = ay   # BMI160的Y轴映射到OpenGL的Z轴
-                    
-                    # 直接影响速度
-                    velocity[0] = ax_mapped * scale_factor
-                    velocity[1] = ay_mapped * scale_factor
-                    velocity[2] = az_mapped * scale_factor
-                    
-                    # 限制最大速度，防止飞出视野
-                    max_velocity = 5.0
-                    velocity[0] = max(min(velocity[0], max_velocity), -max_velocity)
-                    velocity[1] = max(min(velocity[1], max_velocity), -max_velocity)
-                    velocity[2] = max(min(velocity[2], max_velocity), -max_velocity)
-                    
-                    # 应用阻尼，略微增大阻尼以增加控制性
-                    damping = 0.95
-                    velocity[0] *= damping
-                    velocity[1] *= damping
-                    velocity[2] *= damping
-                    
-                    # 应用速度积分获得位置
-                    position[0] += velocity[0] * dt
-                    position[1] += velocity[1] * dt
-                    position[2] += velocity[2] * dt
-                    
-                    # 限制最大位置范围，防止飞出视野
-                    max_position = 10.0
-                    position[0] = max(min(position[0], max_position), -max_position)
-                    position[1] = max(min(position[1], max_position), -max_position)
-                    position[2] = max(min(position[2], max_position), -max_position)
-                    
+                # 滤波和位置积分；校准阶段只收集初始重力样本，这些样本的位置为 NaN，
+                # 校准画面在本帧所有样本处理完后绘制
+                was_calibrating = integrator.is_calibrating
+                samples, _, states = process_block(rows, filter_bank, integrator=integrator, dt=sample_dt)
+                if was_calibrating and not integrator.is_calibrating:  # 收集满100个样本，已计算平均重力偏移
+                    print(f"校准完成，重力偏移: {integrator.gravity_offset}")
+                    position_history.clear()
+                    calibration_done_time = current_time
+                
+                ready = ~np.isnan(states[:, 0])
+                if ready.any():
                     # 打印加速度和位置，用于调试
                     if pygame.time.get_ticks() % 1000 < 16:  # 每秒打印一次
+                        ax, ay, az = samples[-1, :3]
                         print(f"原始加速度: ({ax:.3f}, {ay:.3f}, {az:.3f})")
-                        print(f"映射加速度: ({ax_mapped:.3f}, {ay_mapped:.3f}, {az_mapped:.3f})")
                         print(f"当前速度: ({velocity[0]:.3f}, {velocity[1]:.3f}, {velocity[2]:.3f})")
                         print(f"当前位置: ({position[0]:.3f}, {position[1]:.3f}, {position[2]:.3f})")
                     
+                    # 完整轨迹写入文件
+                    recorder.extend(sample_times[ready], states[ready])
+                    
                     # 只在移动时才记录位置历史，并且降低记录频率，避免轨迹过密
-                    if (abs(velocity[0]) > 0.01 or abs(velocity[1]) > 0.01 or abs(velocity[2]) > 0.01) and pygame.time.get_ticks() % 2 == 0:
-                        position_history.append(position.copy())
+                    for state in states[ready]:
+                        if np.any(np.abs(state[3:]) > 0.01) and pygame.time.get_ticks() % 2 == 0:
+                            position_history.append(state[:3])
                     
                     data_processed = True
-                    
-            except Exception as e:
-                print(f"数据处理错误: {str(e)}")
-                continue
+        
+        # 校准过程中和刚完成时每帧只绘制一次校准画面，不绘制正常场景
+        if integrator.is_calibrating or (calibration_done_time is not None and current_time - calibration_done_time < 2):
+            glClearColor(0.1, 0.1, 0.2, 1)
+            glClear(GL_COLOR_BUFFER_BIT|GL_DEPTH_BUFFER_BIT)
+            glLoadIdentity()
+            gluLookAt(cx, cy, cz, 0, 0, 0, 0, 1, 0)
+            draw_grid()
+            draw_axes()
+            
+            # 在屏幕上显示校准进度或校准结果
+            font = get_font()
+            if integrator.is_calibrating:
+                text = f"校准中... {len(integrator.gravity_samples)}/{integrator.calibration_samples}"
+                textSurface = font.render(text, True, (255, 255, 255))
+                glWindowPos2d(display[0]//2 - 100, display[1]//2)
+            else:
+                gravity_offset = integrator.gravity_offset
+                text = f"校准完成! 重力偏移: {gravity_offset[0]:.4f}, {gravity_offset[1]:.4f}, {gravity_offset[2]:.4f}"
+                textSurface = font.render(text, True, (0, 255, 0))
+                glWindowPos2d(display[0]//2 - 200, display[1]//2)
+            textData = pygame.image.tostring(textSurface, "RGBA", True)
+            glDrawPixels(textSurface.get_width(), textSurface.get_height(), GL_RGBA, GL_UNSIGNED_BYTE, textData)
+            
+            pygame.display.flip()
+            clock.tick(60)
+            continue
 
         # 清除缓冲区并设置背景色
         glClearColor(0.1, 0.1, 0.2, 1)  # 稍微亮一点的背景
@@ -561,7 +499,16 @@ def main():
         # 绘制场景
         draw_grid()
         draw_axes()
-        draw_trail()
+        if scrub_offset > 0:
+            # 回放：读取指定时间段的轨迹，点数过多时自动使用降采样层级
+            # 文件中只有写满的数据块，最近不满一块的轨迹从写入方的缓存中取
+            playback.refresh()
+            scrub_end = current_time - scrub_offset
+            history = playback.query(scrub_end - SCRUB_WINDOW, scrub_end, max_points=MAX_TRAIL_LENGTH)
+            recent = recorder.buffered(scrub_end - SCRUB_WINDOW, scrub_end)
+            draw_trail(np.concatenate((history['mean'], recent['mean']))[:, :3])
+        else:
+            draw_trail()
         draw_position_sphere()
         
         # 在屏幕上显示当前位置文本
@@ -576,11 +523,12 @@ def main():
         status_text = []
         status_text.append(f"位置: X={position[0]:.2f} Y={position[1]:.2f} Z={position[2]:.2f}")
         status_text.append(f"速度: X={velocity[0]:.2f} Y={velocity[1]:.2f} Z={velocity[2]:.2f}")
-        status_text.append(f"敏感度: {current_scale_factor:.2f}")
+        status_text.append(f"敏感度: {integrator.scale_factor:.2f}")
         status_text.append(f"自动重置: {'开启' if auto_reset else '关闭'}")
-        status_text.append(f"{'校准中...' if is_calibrating else '运行中'}")
+        status_text.append(f"{'校准中...' if integrator.is_calibrating else '运行中'}")
+        status_text.append(f"回放: {scrub_offset:.0f}秒前" if scrub_offset else "实时轨迹")
         status_text.append("按键: R-重置轨迹 A-切换自动重置 C-重新校准")
-        status_text.append("上/下箭头-调整敏感度 ESC-退出")
+        status_text.append("上/下箭头-调整敏感度 左/右箭头-回放 ESC-退出")
         
         for i, text in enumerate(status_text):
             draw_text(text, (10, display[1] - 30 * (i + 1)))
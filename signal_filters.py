@@ -0,0 +1,165 @@
+import numpy as np
+from scipy import signal
+from numpy.lib.stride_tricks import sliding_window_view
+
+# 传感器通道顺序：ax, ay, az, gx, gy, gz
+NUM_CHANNELS = 6
+CHANNEL_NAMES = ('ax', 'ay', 'az', 'gx', 'gy', 'gz')
+ACCEL_CHANNELS = (0, 1, 2)
+GYRO_CHANNELS = (3, 4, 5)
+
+# 默认采样率（固件每10ms发送一次）
+DEFAULT_FS = 100.0
+
+# 固件板上对陀螺仪的缩放，原始模式下由上位机应用
+GYRO_SCALE = 0.75
+
+# 预置滤波配置
+# 每一级是一个字典：type 为 lowpass/notch/median/iir/fir，channels 省略时作用于全部通道
+FILTER_PRESETS = {
+    # 不做任何滤波，相位延迟最小
+    'raw': [],
+    # 与旧固件完全一致的一阶低通：y = 0.8*x + 0.2*y_prev
+    'legacy': [
+        {'type': 'iir', 'b': [0.8], 'a': [1.0, -0.2]},
+    ],
+    # 中值去尖峰 + 二阶巴特沃斯低通
+    'smooth': [
+        {'type': 'median', 'size': 3},
+        {'type': 'lowpass', 'cutoff': 15.0, 'order': 2},
+    ],
+    # 陷波示例：去除25Hz附近的干扰（如电机振动），再轻度低通
+    'notch': [
+        {'type': 'notch', 'freq': 25.0, 'q': 5.0},
+        {'type': 'lowpass', 'cutoff': 20.0, 'order': 2},
+    ],
+}
+
+
+class IIRStage:
+    # 线性滤波级（IIR或FIR），按块处理并携带lfilter的zi状态
+    def __init__(self, name, b, a, channels):
+        self.name = name
+        self.b = np.asarray(b, dtype=float)
+        self.a = np.asarray(a, dtype=float)
+        self.channels = list(channels)
+        self.zi = None
+
+    def reset(self):
+        self.zi = None
+
+    def process(self, block):
+        x = block[:, self.channels]
+        if self.zi is None:
+            # 以第一个样本初始化为稳态，避免启动时从0开始的瞬态
+            zi_unit = signal.lfilter_zi(self.b, self.a)
+            self.zi = zi_unit[:, None] * x[0][None, :]
+        y, self.zi = signal.lfilter(self.b, self.a, x, axis=0, zi=self.zi)
+        block[:, self.channels] = y
+        return block
+
+    def group_delay(self, freq, fs):
+        # 在指定频率处的群延迟（单位：样本）
+        _, gd = signal.group_delay((self.b, self.a), w=[freq], fs=fs)
+        return float(gd[0])
+
+
+class MedianStage:
+    # 因果滑动中值滤波，用于剔除单点尖峰，携带上一块末尾的样本
+    def __init__(self, name, size, channels):
+        if size < 1 or size % 2 == 0:
+            raise ValueError(f"中值滤波窗口必须是正奇数: {size}")
+        self.name = name
+        self.size = size
+        self.channels = list(channels)
+        self.tail = None
+
+    def reset(self):
+        self.tail = None
+
+    def process(self, block):
+        if self.size == 1:
+            return block
+        x = block[:, self.channels]
+        if self.tail is None:
+            self.tail = np.repeat(x[:1], self.size - 1, axis=0)
+        padded = np.concatenate((self.tail, x), axis=0)
+        windows = sliding_window_view(padded, self.size, axis=0)
+        block[:, self.channels] = np.median(windows, axis=-1)
+        self.tail = padded[-(self.size - 1):].copy()
+        return block
+
+    def group_delay(self, freq, fs):
+        # 因果中值窗口的延迟近似为窗口中心
+        return (self.size - 1) / 2.0
+
+
+def make_stage(spec, fs=DEFAULT_FS):
+    kind = spec['type']
+    channels = spec.get('channels', range(NUM_CHANNELS))
+    if kind == 'lowpass':
+        b, a = signal.butter(spec.get('order', 2), spec['cutoff'], btype='low', fs=fs)
+        name = f"lowpass({spec['cutoff']}Hz)"
+        return IIRStage(name, b, a, channels)
+    if kind == 'notch':
+        b, a = signal.iirnotch(spec['freq'], spec.get('q', 30.0), fs=fs)
+        name = f"notch({spec['freq']}Hz)"
+        return IIRStage(name, b, a, channels)
+    if kind == 'fir':
+        if 'taps' in spec:
+            taps = spec['taps']
+        else:
+            taps = signal.firwin(spec.get('numtaps', 9), spec['cutoff'], fs=fs)
+        return IIRStage(f"fir({len(taps)})", taps, [1.0], channels)
+    if kind == 'iir':
+        return IIRStage('iir', spec['b'], spec['a'], channels)
+    if kind == 'median':
+        return MedianStage(f"median({spec['size']})", spec['size'], channels)
+    raise ValueError(f"未知的滤波类型: {kind}")
+
+
+class FilterBank:
+    # 按通道配置的滤波链，一次处理一整块 (N, 6) 样本
+    def __init__(self, stages=None, fs=DEFAULT_FS):
+        if isinstance(stages, str):
+            stages = FILTER_PRESETS[stages]
+        self.fs = fs
+        self.stages = [make_stage(spec, fs) for spec in (stages or [])]
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def process(self, block):
+        block = np.array(block, dtype=float, ndmin=2)
+        if len(block) == 0:
+            return block
+        for stage in self.stages:
+            block = stage.process(block)
+        return block
+
+    def group_delay(self, freq=1.0):
+        # 返回每一级的 (名称, 通道, 群延迟)（单位：样本），以及每个通道的总延迟：
+        # 只累加 channels 包含该通道的级，数组长度为 NUM_CHANNELS
+        delays = [(stage.name, stage.channels, stage.group_delay(freq, self.fs)) for stage in self.stages]
+        totals = np.zeros(NUM_CHANNELS)
+        for _, channels, d in delays:
+            totals[channels] += d
+        return delays, totals
+
+    def describe(self, freq=1.0):
+        delays, totals = self.group_delay(freq)
+        lines = []
+        for name, channels, d in delays:
+            scope = '' if len(channels) == NUM_CHANNELS else f" [{','.join(CHANNEL_NAMES[c] for c in channels)}]"
+            lines.append(f"  {name}{scope}: {d:.2f} 样本 ({d * 1000.0 / self.fs:.1f} ms)")
+        # 加速度/陀螺仪各自的总延迟，组内各通道不同时逐通道列出
+        for group, channels in (('加速度', ACCEL_CHANNELS), ('陀螺仪', GYRO_CHANNELS)):
+            values = totals[list(channels)]
+            if np.all(values == values[0]):
+                items = [(group, values[0])]
+            else:
+                items = [(CHANNEL_NAMES[c], totals[c]) for c in channels]
+            for name, total in items:
+                lines.append(f"  {name}总群延迟@{freq}Hz: {total:.2f} 样本 ({total * 1000.0 / self.fs:.1f} ms)")
+        return "\n".join(lines)
@@ -0,0 +1,268 @@
+import os
+import time
+import random
+import threading
+import numpy as np
+from collections import deque
+
+# 串口数据块解析：一次把多行 "ax,ay,az,gx,gy,gz" 转换为 (N, 6) 数组
+# 整块数据用numpy向量化处理，不使用异常处理；
+# 格式错误的行（如固件的"读取数据失败"）只计数并交给诊断回调
+
+# 每个字段最多15位有效数字，保证整数尾数在float64中精确表示，
+# 尾数除以10的幂是正确舍入的，转换结果与 float() 完全一致
+MAX_DIGITS = 15
+# 字段最大字符数：符号 + 小数点 + 有效数字
+MAX_WIDTH = MAX_DIGITS + 2
+POW10 = 10.0 ** np.arange(MAX_DIGITS + 1)
+
+# 快速路径：去掉符号后不超过8个字节的字段（固件输出的 "-249.1234" 正好是符号+8字节），
+# 把字段末尾的8个字节读成一个uint64，用SWAR（一个寄存器内并行处理多个字节）的方法转换，
+# 每个字段只需要十几次整数运算；更长的字段很少见，逐列处理
+WORD = 8
+U64 = np.uint64
+ASCII_ZERO = U64(0x3030303030303030)
+DOT_BYTES = U64(0x1E1E1E1E1E1E1E1E)   # '.' ^ '0'
+LOW7 = U64(0x7F7F7F7F7F7F7F7F)
+HIGH_BIT = U64(0x8080808080808080)
+DIGIT_LIMIT = U64(0x7676767676767676)  # 加上它后 >= 10 的字节最高位为1
+PAIR_MASK = U64(0x000000FF000000FF)
+PAIR_MUL1 = U64(100 + (1000000 << 32))
+PAIR_MUL2 = U64(1 + (10000 << 32))
+# 小端序：字段第一个字符在最低字节，有效字节是最高的 n 个字节
+LIVE_BYTES = np.array([0] + [((1 << (8 * k)) - 1) << (8 * (WORD - k)) for k in range(1, WORD + 1)], dtype=np.uint64)
+# 按小数点所在位置（frexp指数）查表得到 10^小数位数，指数0表示没有小数点；
+# 后半张表是负数字段的除数，除法直接得到带符号的结果
+DOT_SCALE = np.ones(8 * WORD + 1)
+DOT_SCALE[1::8] = 10.0 ** np.arange(WORD - 1, -1, -1)
+DOT_SCALE = np.concatenate((DOT_SCALE, -DOT_SCALE))
+
+
+def decode_narrow(raw, end, length):
+    # 返回 (数值, 是否格式错误)；字段为 end 之前的 length 个字节（已去掉 \r）
+    # 用整块数据的uint64视图一次取出所有字段末尾的8个字节，前面补8个字节避免越界
+    padded = np.concatenate((np.zeros(WORD, dtype=np.uint8), raw))
+    words = np.ndarray((len(raw) + 1,), dtype='<u8', buffer=padded, strides=(1,))
+    first = raw[end - length]
+    negative = first == ord('-')
+    n = length - (negative | (first == ord('+')))
+    live = LIVE_BYTES[np.minimum(n, WORD)]
+    x = (words[end] ^ ASCII_ZERO) & live
+
+    # 找出小数点所在字节（该字节最高位为1），再把它前面的字节整体后移一个字节，去掉小数点
+    y = x ^ DOT_BYTES
+    dot = ~(((y & LOW7) + LOW7) | y | LOW7) & live
+    bit = dot >> U64(7)
+    has_dot = np.minimum(bit, U64(1))
+    x = ((x & (bit - has_dot)) << U64(8)) | (x & ~((bit << U64(8)) - has_dot))
+
+    # 剩下的每个字节都必须是0-9，至多一个小数点，至少一位数字
+    bad = (((((x & LOW7) + DIGIT_LIMIT) | x) & HIGH_BIT) | (dot & (dot - U64(1)))) != 0
+    bad |= n <= has_dot
+
+    # 两两合并相邻数字，再合并成8位整数
+    x = x * U64(10) + (x >> U64(8))
+    x = ((x & PAIR_MASK) * PAIR_MUL1 + ((x >> U64(16)) & PAIR_MASK) * PAIR_MUL2) >> U64(32)
+    scale = np.frexp(bit.astype(np.float64))[1]
+    scale += negative * len(DOT_SCALE) // 2
+    return x / DOT_SCALE[scale], bad
+
+
+def decode_columns(raw, start, end):
+    # 通用路径：从字段末尾向前逐列处理，每一列是所有字段的同一位置
+    # 数值 = 整数尾数 / 10^小数位数
+    length = end - start
+    bad = (length < 1) | (length > MAX_WIDTH)
+    mantissa = np.zeros(len(end))
+    digits = np.zeros(len(end), dtype=np.intp)
+    frac = np.zeros(len(end), dtype=np.intp)
+    dots = np.zeros(len(end), dtype=np.intp)
+    negative = np.zeros(len(end), dtype=bool)
+    for k in range(min(MAX_WIDTH, int(length.max(initial=0)))):
+        idx = end - 1 - k
+        live = k < length
+        c = raw[idx]
+        d = c - np.uint8(ord('0'))
+        is_digit = (d < 10) & live
+        mantissa += np.where(is_digit, d * POW10[np.minimum(digits, MAX_DIGITS)], 0.0)
+        digits += is_digit
+        is_dot = (c == ord('.')) & live
+        frac = np.where(is_dot, digits, frac)
+        dots += is_dot
+        # 符号只能出现在字段开头
+        first = idx == start
+        is_sign = ((c == ord('-')) | (c == ord('+'))) & first & live
+        negative |= is_sign & (c == ord('-'))
+        bad |= live & ~is_digit & ~is_dot & ~is_sign
+    bad |= (dots > 1) | (digits < 1) | (digits > MAX_DIGITS)
+
+    values = mantissa / POW10[np.minimum(frac, MAX_DIGITS)]
+    values[negative] = -values[negative]
+    return values, bad
+
+
+class ChunkParser:
+    def __init__(self, fields=6, on_malformed=None, history=100):
+        self.fields = fields
+        # 诊断回调，参数为本块中格式错误的行（已解码的字符串列表）
+        self.on_malformed = on_malformed
+        # 上一块末尾不完整的行，等下一块补齐
+        self.tail = b''
+        self.lines = 0
+        self.malformed = 0
+        self.recent_malformed = deque(maxlen=history)
+
+    def reset(self):
+        self.tail = b''
+
+    def feed(self, chunk):
+        data = self.tail + chunk
+        end = data.rfind(b'\n') + 1
+        self.tail = data[end:]
+        if end == 0:
+            return np.empty((0, self.fields))
+        return self._parse(data[:end])
+
+    def _parse(self, data):
+        raw = np.frombuffer(data, dtype=np.uint8)
+
+        # 以逗号和换行符切分字段，每个字段只处理一次
+        sep_pos = np.flatnonzero((raw == ord(',')) | (raw == ord('\n')))
+        start = np.empty(len(sep_pos), dtype=np.intp)
+        start[0] = 0
+        start[1:] = sep_pos[:-1] + 1
+        # 去掉println产生的 \r
+        end = sep_pos - (raw[sep_pos - 1] == ord('\r'))
+        length = end - start
+
+        values, bad = decode_narrow(raw, end, length)
+        # 超过8个字节的字段：太长的直接算错误（如固件的中文提示），其余逐列处理
+        wide = np.flatnonzero(length > WORD)
+        if len(wide):
+            first = raw[start[wide]]
+            wide = wide[length[wide] - ((first == ord('-')) | (first == ord('+'))) > WORD]
+            bad[wide] = True
+            wide = wide[length[wide] <= MAX_WIDTH]
+            values[wide], bad[wide] = decode_columns(raw, start[wide], end[wide])
+
+        # 每行的最后一个字段以换行符结束
+        line_last = np.flatnonzero(raw[sep_pos] == ord('\n'))
+        fields_per_line = np.diff(line_last, prepend=-1)
+        bad_count = np.cumsum(bad)[line_last]
+        bad_line = np.diff(bad_count, prepend=0) > 0
+        bad_line |= fields_per_line != self.fields
+        # 只有 \r 或完全为空的行不算错误
+        blank_line = (fields_per_line == 1) & (length[line_last] == 0)
+        bad_line &= ~blank_line
+        self.lines += len(line_last) - int(np.count_nonzero(blank_line))
+        if bad_line.any():
+            self._report_malformed(data, sep_pos[line_last], bad_line)
+
+        good_last = line_last[~bad_line & ~blank_line]
+        return values[good_last[:, None] + np.arange(1 - self.fields, 1)]
+
+    def _report_malformed(self, data, line_end, bad_line):
+        # 只取出错误行的内容，正常数据不会走到这里
+        line_start = np.concatenate(([0], line_end[:-1] + 1))
+        bad = [data[line_start[i]:line_end[i]].decode('utf-8', errors='replace').strip()
+               for i in np.flatnonzero(bad_line)]
+        self.malformed += len(bad)
+        self.recent_malformed.extend(bad)
+        if self.on_malformed:
+            self.on_malformed(bad)
+
+
+def print_malformed(lines):
+    # 默认的诊断输出：直接打印设备发来的非数据行
+    for line in lines:
+        print(f"Arduino输出: {line}")
+
+
+def parse_line(line):
+    # 旧版逐行解析方式（readline之后），仅作为基准对比
+    line = line.decode('utf-8', errors='ignore').strip()
+    if ',' not in line:
+        return None
+    try:
+        data = [float(x) for x in line.split(',')]
+    except Exception:
+        return None
+    return data if len(data) == 6 else None
+
+
+def make_benchmark_stream(lines=100000, error_every=500, seed=0):
+    # 生成与固件输出格式一致的测试数据流，夹杂少量错误行
+    rng = random.Random(seed)
+    out = []
+    for i in range(lines):
+        if error_every and i % error_every == error_every - 1:
+            out.append("读取数据失败，错误代码：-2")
+        else:
+            out.append(",".join(f"{rng.uniform(-2, 2):.4f}" for _ in range(3)) + "," +
+                       ",".join(f"{rng.uniform(-250, 250):.4f}" for _ in range(3)))
+    return ("\r\n".join(out) + "\r\n").encode('utf-8')
+
+
+def serial_throughput(data, expected, chunked):
+    # 通过pty把数据流送进pyserial，测量与可视化程序相同的读取+解析路径
+    # pty只在类Unix系统上可用，解析器本身不依赖它，放在函数内导入
+    import tty
+    import serial
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    ser = serial.Serial(os.ttyname(slave), 115200, timeout=1)
+
+    def write_all():
+        view = memoryview(data)
+        while view:
+            view = view[os.write(master, view):]
+
+    writer = threading.Thread(target=write_all)
+    start = time.perf_counter()
+    writer.start()
+    count = 0
+    parser = ChunkParser()
+    while count < expected:
+        if chunked:
+            count += len(parser.feed(ser.read(max(ser.in_waiting, 1))))
+        else:
+            line = ser.readline()
+            if not line:
+                break
+            count += parse_line(line) is not None
+    elapsed = time.perf_counter() - start
+    writer.join()
+    ser.close()
+    os.close(master)
+    os.close(slave)
+    return count / elapsed
+
+
+def benchmark(chunk_size=65536):
+    data = make_benchmark_stream()
+
+    start = time.perf_counter()
+    rows = [r for r in (parse_line(line) for line in data.split(b'\n')) if r is not None]
+    per_line = len(rows) / (time.perf_counter() - start)
+
+    parser = ChunkParser()
+    start = time.perf_counter()
+    blocks = [parser.feed(data[i:i + chunk_size]) for i in range(0, len(data), chunk_size)]
+    result = np.concatenate(blocks)
+    chunked = len(result) / (time.perf_counter() - start)
+    assert np.array_equal(result, np.array(rows))
+
+    print(f"仅解析  逐行: {per_line:,.0f} 行/秒  分块: {chunked:,.0f} 行/秒  "
+          f"加速比: {chunked / per_line:.1f}x  错误行: {parser.malformed}")
+
+    # 串口读取 + 解析，readline逐行读取非常慢，使用较短的数据流
+    data = make_benchmark_stream(lines=5000)
+    expected = len(ChunkParser().feed(data))
+    per_line = serial_throughput(data, expected, chunked=False)
+    chunked = serial_throughput(data, expected, chunked=True)
+    print(f"串口读取+解析  逐行: {per_line:,.0f} 行/秒  分块: {chunked:,.0f} 行/秒  "
+          f"加速比: {chunked / per_line:.1f}x")
+
+
+if __name__ == "__main__":
+    benchmark()
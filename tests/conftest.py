@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 程序都是仓库根目录下的单个模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
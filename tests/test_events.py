@@ -0,0 +1,50 @@
+import math
+import numpy as np
+import pytest
+from events import EventEngine
+from fusion import ComplementaryFilter
+
+FS = 100
+
+
+def gesture_stream(tap=None, width=1, seconds=13, seed=0):
+    # 静止 → 2秒时敲击（可选） → 4~5秒摇晃 → 7~7.5秒翻转 → 10~10.3秒自由落体
+    t = np.arange(seconds * FS) / FS
+    samples = np.zeros((len(t), 6))
+    samples[:, 2] = 1.0
+    samples += np.random.default_rng(seed).normal(0, 0.01, samples.shape)
+    if tap is not None:
+        samples[2 * FS:2 * FS + width, 0] += tap
+    shake = (t >= 4) & (t < 5)
+    samples[shake, 0] += 1.5 * np.sin(2 * np.pi * 5 * t[shake])
+    angle = np.clip((t - 7) / 0.5, 0, 1) * math.pi
+    samples[:, 1] += np.sin(angle)
+    samples[:, 2] += np.cos(angle) - 1
+    samples[(t >= 10) & (t < 10.3), :3] *= 0.05
+    samples[:, 3] = np.gradient(np.degrees(angle)) * FS
+    attitude = ComplementaryFilter()
+    poses = np.array([attitude.update(*sample) for sample in samples])
+    return t, samples, poses
+
+
+def taps(tap=None, width=1):
+    events = EventEngine().process(*gesture_stream(tap, width))
+    return [event['time'] for event in events if event['type'] == 'tap']
+
+
+def test_no_tap_from_other_gestures():
+    assert taps() == []
+
+
+@pytest.mark.parametrize('width', [1, 2, 3])
+@pytest.mark.parametrize('amplitude', [0.5, 1.0, 2.0, 4.0, 8.0])
+def test_tap_any_amplitude(amplitude, width):
+    # 敲击越用力，窗口能量越大；静止判断只看敲击之前和之后，不应受尖峰大小影响
+    assert taps(amplitude, width) == [pytest.approx(2.0)]
+
+
+def test_gestures_still_detected_with_tap():
+    events = EventEngine().process(*gesture_stream(2.0))
+    kinds = [event['type'] for event in events]
+    for kind in ('tap', 'shake', 'flip', 'freefall'):
+        assert kind in kinds
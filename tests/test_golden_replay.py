@@ -0,0 +1,20 @@
+import os
+import sys
+import subprocess
+import pytest
+from golden_replay import CASES, replay_case
+
+
+@pytest.mark.parametrize('name', list(CASES))
+def test_replay_matches_golden(name):
+    # 回放保存的数据流，输出必须在容差内与基准轨迹一致，且与分块大小无关
+    result = replay_case(name)
+    assert result['deterministic']
+    assert result['passed'], result['max_error']
+
+
+def test_no_platform_specific_imports():
+    # 基准回放和事件检测的命令行不需要pty，在Windows上也要能导入
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = "import sys, golden_replay, events; assert 'tty' not in sys.modules and 'termios' not in sys.modules"
+    subprocess.run([sys.executable, '-c', code], cwd=root, check=True)
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from signal_filters import FilterBank, FILTER_PRESETS, NUM_CHANNELS
+
+# 只作用于部分通道的自定义配置：陀螺仪中值去尖峰、ax用FIR、全部通道陷波
+CUSTOM = [
+    {'type': 'median', 'size': 5, 'channels': [3, 4, 5]},
+    {'type': 'fir', 'numtaps': 9, 'cutoff': 10.0, 'channels': [0]},
+    {'type': 'notch', 'freq': 25.0, 'q': 5.0},
+]
+
+
+def random_block(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    block = rng.normal(0, 1, (n, NUM_CHANNELS)).cumsum(axis=0) * 0.1
+    # 加入单点尖峰，让中值滤波有事可做
+    block[rng.integers(0, n, 20), rng.integers(0, NUM_CHANNELS, 20)] += 5.0
+    return block
+
+
+@pytest.mark.parametrize('config', list(FILTER_PRESETS) + ['custom'])
+def test_block_splits_match_whole(config):
+    # 滤波状态（lfilter的zi、中值的tail）在块之间延续，任意切分的结果与整块处理一致
+    stages = CUSTOM if config == 'custom' else config
+    data = random_block()
+    whole = FilterBank(stages).process(data)
+    rng = np.random.default_rng(1)
+    for _ in range(5):
+        cuts = np.sort(rng.choice(np.arange(1, len(data)), 12, replace=False))
+        bank = FilterBank(stages)
+        parts = np.concatenate([bank.process(part) for part in np.split(data, cuts)])
+        np.testing.assert_allclose(parts, whole, rtol=0, atol=1e-12)
+    # 输入不被修改
+    assert np.array_equal(data, random_block())
+
+
+def test_channels_limit_stages():
+    data = random_block()
+    out = FilterBank(CUSTOM[:2]).process(data)
+    # 只有 ax 和陀螺仪通道经过滤波
+    assert np.array_equal(out[:, 1:3], data[:, 1:3])
+    assert not np.array_equal(out[:, 0], data[:, 0])
+    assert not np.array_equal(out[:, 3:], data[:, 3:])
+
+
+def test_legacy_matches_firmware():
+    # 固件：y = 0.8*x + 0.2*y_prev；上位机以第一个样本为稳态初始化，相当于 y_prev = x[0]
+    data = random_block(200)
+    out = FilterBank('legacy').process(data)
+    expected = np.empty_like(data)
+    prev = data[0]
+    for i, x in enumerate(data):
+        prev = 0.8 * x + 0.2 * prev
+        expected[i] = prev
+    np.testing.assert_allclose(out, expected, rtol=0, atol=1e-12)
+
+
+def test_group_delay_per_channel():
+    # 9阶（9个系数）对称FIR的群延迟为4个样本，5点中值按窗口中心计为2个样本
+    delays, totals = FilterBank([{'type': 'fir', 'numtaps': 9, 'cutoff': 10.0}]).group_delay()
+    assert delays[0][2] == pytest.approx(4.0)
+    assert totals == pytest.approx([4.0] * NUM_CHANNELS)
+
+    notch = FilterBank([CUSTOM[2]]).group_delay()[1][0]
+    _, totals = FilterBank(CUSTOM).group_delay()
+    assert totals[0] == pytest.approx(4.0 + notch)
+    assert totals[1] == totals[2] == pytest.approx(notch)
+    assert totals[3:] == pytest.approx([2.0 + notch] * 3)
+
+    _, totals = FilterBank('raw').group_delay()
+    assert np.array_equal(totals, np.zeros(NUM_CHANNELS))
@@ -0,0 +1,114 @@
+import os
+import sys
+import random
+import subprocess
+import numpy as np
+from stream_parser import ChunkParser, parse_line, make_benchmark_stream
+
+
+def parse(data, fields=6):
+    parser = ChunkParser(fields=fields)
+    return parser.feed(data), parser
+
+
+def test_crlf_and_lf():
+    rows, parser = parse(b"1,2,3,4,5,6\r\n-1.5,+2.25,.5,7.,0,-0\n")
+    assert rows.tolist() == [[1, 2, 3, 4, 5, 6], [-1.5, 2.25, 0.5, 7.0, 0.0, -0.0]]
+    assert parser.lines == 2 and parser.malformed == 0
+
+
+def test_single_cr_before_separator():
+    # 与 float() 一样，分隔符前的一个 \r 会被忽略，多余的 \r 算错误
+    rows, parser = parse(b"1,2\r,3,4,5,6\r\n1,2,3,4,5,6\r\r\n\r1,2,3,4,5,6\n")
+    assert rows.tolist() == [[1, 2, 3, 4, 5, 6]]
+    assert parser.malformed == 2
+
+
+def test_blank_lines_are_skipped_not_counted():
+    rows, parser = parse(b"\r\n\n1,2,3,4,5,6\r\n\r\n")
+    assert rows.tolist() == [[1, 2, 3, 4, 5, 6]]
+    assert parser.lines == 1 and parser.malformed == 0
+
+
+def test_partial_tail_line_carries_over():
+    parser = ChunkParser()
+    assert len(parser.feed(b"1,2,3,")) == 0
+    assert parser.tail == b"1,2,3,"
+    rows = parser.feed(b"4,5,6\r\n7,8")
+    assert rows.tolist() == [[1, 2, 3, 4, 5, 6]]
+    assert parser.tail == b"7,8"
+    rows = parser.feed(b",9,10,11,12.5\r\n")
+    assert rows.tolist() == [[7, 8, 9, 10, 11, 12.5]]
+    parser.reset()
+    assert parser.tail == b""
+
+
+def test_any_chunking_gives_same_rows():
+    data = make_benchmark_stream(lines=300, error_every=7)
+    whole, _ = parse(data)
+    for size in (1, 5, 61, 4096):
+        parser = ChunkParser()
+        rows = np.concatenate([parser.feed(data[i:i + size]) for i in range(0, len(data), size)])
+        assert np.array_equal(rows, whole)
+        assert parser.malformed == 300 // 7
+
+
+def test_sign_only_at_field_start():
+    bad = [b"1-2", b"1.5-", b"--1", b"+-1", b"12.3+4", b"-", b"+"]
+    for field in bad:
+        rows, parser = parse(b"1,2,3,4,5," + field + b"\n")
+        assert len(rows) == 0, field
+        assert parser.malformed == 1
+
+
+def test_other_malformed_fields():
+    for field in [b"", b".", b"1..2", b"1.2.3", b"1 2", b"abc", b"0x10", b"1e5"]:
+        rows, parser = parse(field + b",2,3,4,5,6\n")
+        assert len(rows) == 0, field
+        assert parser.malformed == 1
+
+
+def test_field_count_and_error_text():
+    reported = []
+    parser = ChunkParser(on_malformed=reported.extend)
+    rows = parser.feed("1,2,3,4,5\r\n1,2,3,4,5,6,7\r\n读取数据失败，错误代码：-2\r\n1,2,3,4,5,6\r\n".encode('utf-8'))
+    assert rows.tolist() == [[1, 2, 3, 4, 5, 6]]
+    assert reported == ["1,2,3,4,5", "1,2,3,4,5,6,7", "读取数据失败，错误代码：-2"]
+    assert list(parser.recent_malformed) == reported
+
+
+def test_long_fields():
+    # 15位有效数字以内按通用路径转换，结果与 float() 相同
+    ok = [b"123456789", b"-123456789", b"1234567.89", b"0.000000001", b"+12345678.1234567", b"123456789012345"]
+    rows, _ = parse(b",".join(ok) + b"\n")
+    assert rows.tolist() == [[float(f) for f in ok]]
+    # 超过15位有效数字或17个字符的字段算错误
+    for field in [b"1234567890123456", b"-0.1234567890123456", b"000000000000000001"]:
+        rows, parser = parse(b"1,2,3,4,5," + field + b"\n")
+        assert len(rows) == 0, field
+        assert parser.malformed == 1
+
+
+def test_matches_float():
+    rng = random.Random(0)
+    lines = []
+    for _ in range(2000):
+        values = []
+        for _ in range(6):
+            value = f"{rng.uniform(-300, 300):.{rng.randint(0, 8)}f}"
+            if rng.random() < 0.1:
+                value = value.lstrip('-').lstrip('0') or '0'
+            values.append(value)
+        lines.append(",".join(values))
+    data = ("\r\n".join(lines) + "\r\n").encode()
+    rows, parser = parse(data)
+    expected = [parse_line(line) for line in data.split(b"\n")[:-1]]
+    assert parser.malformed == 0
+    assert np.array_equal(rows, np.array(expected))
+
+
+def test_no_platform_specific_imports():
+    # 可视化程序在Windows上也要导入解析器，tty/termios 只有类Unix系统才有
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = "import sys, stream_parser; assert 'tty' not in sys.modules and 'termios' not in sys.modules"
+    subprocess.run([sys.executable, '-c', code], cwd=root, check=True)
@@ -0,0 +1,79 @@
+import numpy as np
+from trajectory_store import TrajectoryWriter, TrajectoryReader
+
+
+def test_live_query_combines_file_and_buffer(tmp_path):
+    path = str(tmp_path / 'live.traj')
+    writer = TrajectoryWriter(path, ['x', 'y'], chunk_size=64)
+    reader = TrajectoryReader(path)
+    t = np.arange(1000) / 100.0
+    values = np.column_stack((np.sin(t), np.cos(t)))
+    for i in range(0, len(t), 10):
+        writer.extend(t[i:i + 10], values[i:i + 10])
+        # 只写出满的数据块，其余的点留在写入方的缓存中
+        reader.refresh()
+        assert all(count >= 64 for _, count, _ in reader.index[0][2])
+        stored = reader.query(-np.inf, np.inf, level=0)
+        recent = writer.buffered(-np.inf, np.inf)
+        combined = np.concatenate((stored['mean'], recent['mean']))
+        assert np.array_equal(combined, values[:i + 10])
+        assert np.array_equal(np.concatenate((stored['t'], recent['t'])), t[:i + 10])
+
+    window = writer.buffered(t[990], t[995])
+    assert np.array_equal(window['t'], t[990:996])
+    writer.close()
+    reader.refresh()
+    assert np.array_equal(reader.query(-np.inf, np.inf, level=0)['mean'], values)
+    reader.close()
+
+
+def write_random(path, n=1000, factor=4, levels=3, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.cumsum(rng.uniform(0.005, 0.015, n))
+    values = rng.normal(0, 1, (n, 3)).cumsum(axis=0)
+    writer = TrajectoryWriter(path, ['a', 'b', 'c'], chunk_size=50, factor=factor, levels=levels)
+    # 按随机长度分批追加，数据块边界与金字塔分组不对齐
+    cuts = np.sort(rng.choice(np.arange(1, n), 40, replace=False))
+    for part_t, part_v in zip(np.split(t, cuts), np.split(values, cuts)):
+        writer.extend(part_t, part_v)
+    writer.close()
+    return t, values
+
+
+def test_pyramid_levels_match_raw_reductions(tmp_path):
+    # 第L层第g个点汇总原始点 [g*factor^L, (g+1)*factor^L)，最后不满的一组由 flush(final=True) 写出
+    path = str(tmp_path / 'pyramid.traj')
+    factor, levels = 4, 3
+    t, values = write_random(path, factor=factor, levels=levels)
+    reader = TrajectoryReader(path)
+    for level in range(levels + 1):
+        result = reader.query(-np.inf, np.inf, level=level)
+        size = factor ** level
+        starts = np.arange(0, len(t), size)
+        assert len(result['t']) == len(starts) == -(-len(t) // size)
+        assert np.array_equal(result['t'], t[starts])
+        assert np.array_equal(result['min'], np.minimum.reduceat(values, starts))
+        assert np.array_equal(result['max'], np.maximum.reduceat(values, starts))
+        counts = np.diff(np.append(starts, len(t)))
+        np.testing.assert_allclose(result['mean'], np.add.reduceat(values, starts) / counts[:, None],
+                                   rtol=1e-12, atol=1e-12)
+    # 1000 不是 4^3 的倍数，最后一组只有部分点
+    assert len(t) % factor ** levels
+    reader.close()
+
+
+def test_query_picks_finest_level_within_max_points(tmp_path):
+    path = str(tmp_path / 'levels.traj')
+    t, _ = write_random(path)
+    reader = TrajectoryReader(path)
+    sizes = [len(reader.query(-np.inf, np.inf, level=level)['t']) for level in range(reader.levels + 1)]
+    assert sizes == [1000, 250, 63, 16]
+    for max_points in (5000, 1000, 999, 250, 249, 63, 62, 16):
+        result = reader.query(-np.inf, np.inf, max_points=max_points)
+        level = result['level']
+        assert len(result['t']) == sizes[level] <= max_points
+        # 更精细的一层会超出 max_points
+        assert level == 0 or sizes[level - 1] > max_points
+    # 最粗的一层也超出时返回最粗的一层
+    assert reader.query(-np.inf, np.inf, max_points=10)['level'] == reader.levels
+    reader.close()
@@ -0,0 +1,249 @@
+import os
+import json
+import zlib
+import time
+import struct
+import argparse
+import numpy as np
+from bisect import bisect_left, bisect_right
+
+# 轨迹存储：按块追加写入的压缩文件，带时间索引和多分辨率金字塔
+#
+# 文件结构：
+#   文件头  MAGIC + uint32 长度 + JSON（通道名、金字塔倍率等）
+#   数据块  CHUNK 头（层级、点数、压缩长度、起止时间） + zlib压缩数据
+# 第0层保存原始点，第L层每个点汇总 factor^L 个原始点的 min/max/mean。
+# 数据块只追加不修改，读取方可以在写入的同时刷新索引读取新数据。
+
+MAGIC = b'BMTRAJ1\n'
+CHUNK = struct.Struct('<4sBIIdd')
+CHUNK_MARKER = b'CHNK'
+
+
+def encode_columns(columns):
+    # float64按位视为int64后做差分，再按字节重排，平滑数据的高位字节几乎全为0，压缩率很高
+    # 整数差分是无损的，解码得到的浮点数与原值逐位相同
+    data = np.ascontiguousarray(np.column_stack(columns), dtype=np.float64)
+    bits = data.view(np.int64)
+    delta = np.diff(bits, axis=0, prepend=np.zeros((1, bits.shape[1]), dtype=np.int64))
+    shuffled = delta.view(np.uint8).reshape(len(data), data.shape[1], 8).transpose(2, 1, 0)
+    return zlib.compress(shuffled.tobytes(), 6)
+
+
+def decode_columns(payload, count, width):
+    shuffled = np.frombuffer(zlib.decompress(payload), dtype=np.uint8).reshape(8, width, count)
+    delta = np.ascontiguousarray(shuffled.transpose(2, 1, 0)).view(np.int64).reshape(count, width)
+    return np.cumsum(delta, axis=0).view(np.float64)
+
+
+class TrajectoryWriter:
+    def __init__(self, path, channels, chunk_size=1024, factor=16, levels=4):
+        self.path = path
+        self.channels = list(channels)
+        self.chunk_size = chunk_size
+        self.factor = factor
+        self.levels = levels
+        self.file = open(path, 'wb')
+        header = json.dumps({'channels': self.channels, 'factor': factor, 'levels': levels}).encode('utf-8')
+        self.file.write(MAGIC + struct.pack('<I', len(header)) + header)
+        self.file.flush()
+        # 第0层缓存原始点，更高层缓存待合并的 (t, count, min, max, mean)
+        self.times = []
+        self.values = []
+        self.pending = [None] * (levels + 1)
+        self.output = [[] for _ in range(levels + 1)]
+
+    def append(self, t, values):
+        self.times.append(t)
+        self.values.append(values)
+        if len(self.times) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, times, values):
+        # 整块追加，values 形状为 (N, 通道数)
+        self.times.extend(np.asarray(times, dtype=float))
+        self.values.extend(np.asarray(values, dtype=float))
+        if len(self.times) >= self.chunk_size:
+            self.flush()
+
+    def buffered(self, t0, t1):
+        # 还没有写入文件的原始点（不满一个数据块），格式与 TrajectoryReader.query 第0层相同；
+        # 同一进程里实时回看最近几秒时与读取结果拼接，不需要为此提前写出小数据块
+        t = np.array(self.times, dtype=float)
+        v = np.array(self.values, dtype=float).reshape(len(t), len(self.channels))
+        keep = (t >= t0) & (t <= t1)
+        t, v = t[keep], v[keep]
+        return {'level': 0, 't': t, 'min': v, 'max': v, 'mean': v}
+
+    def flush(self, final=False):
+        # 写出已缓存的数据；final 为 True 时把不满一组的金字塔点也写出
+        # 数据块满 chunk_size 个点时自动调用，平时不要按时间调用，小数据块几乎没有压缩效果
+        if self.times:
+            t = np.array(self.times, dtype=float)
+            v = np.array(self.values, dtype=float).reshape(len(t), len(self.channels))
+            self.times, self.values = [], []
+            self._write(0, t, [t, v])
+            self._aggregate(1, t, np.ones(len(t)), v, v, v)
+        for level in range(1, self.levels + 1):
+            if final and self.pending[level] is not None:
+                self._reduce(level, final=True)
+            if self.output[level]:
+                parts = self.output[level]
+                self.output[level] = []
+                t, n, lo, hi, mean = (np.concatenate(p) for p in zip(*parts))
+                self._write(level, t, [t, n, lo, hi, mean])
+        self.file.flush()
+
+    def close(self):
+        self.flush(final=True)
+        self.file.close()
+
+    def _aggregate(self, level, t, n, lo, hi, mean):
+        if level > self.levels:
+            return
+        item = (t, n, lo, hi, mean)
+        if self.pending[level] is not None:
+            item = tuple(np.concatenate((a, b)) for a, b in zip(self.pending[level], item))
+        self.pending[level] = item
+        self._reduce(level)
+
+    def _reduce(self, level, final=False):
+        t, n, lo, hi, mean = self.pending[level]
+        groups = len(t) // self.factor
+        if final and len(t) % self.factor:
+            groups += 1
+        if groups == 0:
+            return
+        # 把 factor 个点合并为一个：最小值取最小、最大值取最大、均值按点数加权
+        used = min(groups * self.factor, len(t))
+        starts = np.arange(0, used, self.factor)
+        count = np.add.reduceat(n[:used], starts)
+        out = (
+            t[starts],
+            count,
+            np.minimum.reduceat(lo[:used], starts, axis=0),
+            np.maximum.reduceat(hi[:used], starts, axis=0),
+            np.add.reduceat(mean[:used] * n[:used, None], starts, axis=0) / count[:, None],
+        )
+        rest = tuple(a[used:] for a in (t, n, lo, hi, mean))
+        self.pending[level] = rest if len(rest[0]) else None
+        self.output[level].append(out)
+        self._aggregate(level + 1, *out)
+
+    def _write(self, level, t, columns):
+        payload = encode_columns(columns)
+        self.file.write(CHUNK.pack(CHUNK_MARKER, level, len(t), len(payload), t[0], t[-1]) + payload)
+
+
+class TrajectoryReader:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        magic = self.file.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(f"不是轨迹文件: {path}")
+        (length,) = struct.unpack('<I', self.file.read(4))
+        header = json.loads(self.file.read(length))
+        self.channels = header['channels']
+        self.factor = header['factor']
+        self.levels = header['levels']
+        self.offset = self.file.tell()
+        # 每层的时间索引：起始时间、结束时间、(文件偏移, 点数, 压缩长度)
+        self.index = [([], [], []) for _ in range(self.levels + 1)]
+        self.refresh()
+
+    def refresh(self):
+        # 只读取新增数据块的块头，不解压数据；写入中的不完整数据块留到下次再读
+        size = os.fstat(self.file.fileno()).st_size
+        while self.offset + CHUNK.size <= size:
+            self.file.seek(self.offset)
+            marker, level, count, length, t0, t1 = CHUNK.unpack(self.file.read(CHUNK.size))
+            if marker != CHUNK_MARKER:
+                raise ValueError(f"轨迹文件损坏，偏移 {self.offset}")
+            if self.offset + CHUNK.size + length > size:
+                break
+            starts, ends, entries = self.index[level]
+            starts.append(t0)
+            ends.append(t1)
+            entries.append((self.offset + CHUNK.size, count, length))
+            self.offset += CHUNK.size + length
+
+    def close(self):
+        self.file.close()
+
+    def time_range(self):
+        starts, ends, _ = self.index[0]
+        if not starts:
+            return None
+        return starts[0], ends[-1]
+
+    def count(self, t0, t1, level):
+        # 估计时间范围内的点数：只用索引，按与每个数据块的时间重叠比例折算
+        starts, ends, entries = self.index[level]
+        first, last = bisect_left(ends, t0), bisect_right(starts, t1)
+        total = 0.0
+        for start, end, entry in zip(starts[first:last], ends[first:last], entries[first:last]):
+            span = end - start
+            overlap = min(end, t1) - max(start, t0)
+            total += entry[1] if span <= 0 else entry[1] * max(overlap, 0.0) / span
+        return total
+
+    def query(self, t0, t1, max_points=None, level=None):
+        # 返回时间范围内的 t, min, max, mean（第0层三者相同）
+        # 指定 max_points 时自动选择点数不超过它的最精细层级
+        if level is None:
+            level = 0
+            while (max_points and level < self.levels and self.index[level + 1][0]
+                   and self.count(t0, t1, level) > max_points):
+                level += 1
+        width = len(self.channels)
+        starts, ends, entries = self.index[level]
+        first, last = bisect_left(ends, t0), bisect_right(starts, t1)
+        blocks = []
+        for offset, count, length in entries[first:last]:
+            self.file.seek(offset)
+            columns = decode_columns(self.file.read(length), count, 1 + width if level == 0 else 2 + 3 * width)
+            blocks.append(columns)
+        if not blocks:
+            empty = np.empty((0, width))
+            return {'level': level, 't': np.empty(0), 'min': empty, 'max': empty, 'mean': empty}
+        data = np.concatenate(blocks)
+        data = data[(data[:, 0] >= t0) & (data[:, 0] <= t1)]
+        if level == 0:
+            values = data[:, 1:]
+            return {'level': level, 't': data[:, 0], 'min': values, 'max': values, 'mean': values}
+        return {
+            'level': level,
+            't': data[:, 0],
+            'min': data[:, 2:2 + width],
+            'max': data[:, 2 + width:2 + 2 * width],
+            'mean': data[:, 2 + 2 * width:],
+        }
+
+
+def new_recording_path(directory, prefix, ext='.traj'):
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{prefix}_{time.strftime('%Y%m%d_%H%M%S')}{ext}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='查看轨迹文件')
+    parser.add_argument('path', help='轨迹文件路径')
+    parser.add_argument('--start', type=float, help='起始时间（相对文件开头，秒）')
+    parser.add_argument('--end', type=float, help='结束时间（相对文件开头，秒）')
+    parser.add_argument('--points', type=int, default=20, help='最多输出的点数')
+    args = parser.parse_args()
+
+    reader = TrajectoryReader(args.path)
+    span = reader.time_range()
+    if span is None:
+        print("文件中没有数据")
+    else:
+        t0 = span[0] + (args.start or 0.0)
+        t1 = span[0] + args.end if args.end is not None else span[1]
+        result = reader.query(t0, t1, max_points=args.points)
+        print(f"通道: {', '.join(reader.channels)}  时长: {span[1] - span[0]:.1f} 秒  层级: {result['level']}")
+        for i, t in enumerate(result['t']):
+            mean = ' '.join(f"{v:8.3f}" for v in result['mean'][i])
+            print(f"{t - span[0]:9.2f}s  {mean}")
+    reader.close()